@@ -9,6 +9,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from scripts.core.llm_calls import extract_variables, build_answer
 from scripts.core.recommend_recompute import recommend_recompute
 from utils.format_interpreter import standardize_input
+from utils.metrics import metrics
 # RAG functionality removed - using LLM calls instead
 # from utils.rag_utils import ecoform_rag_call
 
@@ -135,3 +136,10 @@ try:
     print("\n" + summary)
 except Exception as e:
     print(f"❌ Failed to generate summary: {e}")
+
+# === Stage timings (python main.py --metrics [out.json]) ===
+if "--metrics" in sys.argv:
+    idx = sys.argv.index("--metrics")
+    out_path = sys.argv[idx + 1] if len(sys.argv) > idx + 1 else None
+    print("\n⏱ Stage metrics:")
+    print(metrics.dump_json(out_path))
@@ -1,8 +1,10 @@
 # scripts/acoustic_pipeline.py
 
-from .llm_calls import extract_variables, build_answer
+from .llm_calls import extract_variables, build_answer, build_answer_stream, is_structured
 from .sql_calls import query_or_recommend
 from utils.format_interpreter import standardize_input
+from utils.single_flight import SingleFlight, flight_key
+from utils.metrics import metrics
 
 # Import the geometry ML interface
 try:
@@ -12,6 +14,20 @@ except ImportError:
     print("⚠️ Geometry ML interface not available - using standard pipeline")
     GEOMETRY_ML_AVAILABLE = False
 
+# Identical concurrent runs (same input, question and geometry) share one computation
+pipeline_flight = SingleFlight("run_pipeline")
+metrics.register_collector("pipeline_flight", pipeline_flight.stats)
+
+def compute_result(user_input: dict, geometry_data: dict = None) -> dict:
+    """
+    The numeric part of the pipeline (SQL / ML / compliance / recommendations), no LLM.
+    """
+    # If geometry data is available, enhance the prediction
+    if GEOMETRY_ML_AVAILABLE and geometry_data:
+        return run_enhanced_pipeline(user_input, geometry_data)
+    # Fall back to standard pipeline
+    return query_or_recommend(user_input)
+
 def run_pipeline(user_input: dict, user_question: str = "", geometry_data: dict = None) -> dict:
     """
     Given structured user_input, run the full acoustic pipeline.
@@ -23,14 +39,11 @@ def run_pipeline(user_input: dict, user_question: str = "", geometry_data: dict
         geometry_data: Optional IFC element data from geometry selection
     """
     user_input = standardize_input(user_input)
-    
-    # If geometry data is available, enhance the prediction
-    if GEOMETRY_ML_AVAILABLE and geometry_data:
-        enhanced_result = run_enhanced_pipeline(user_input, geometry_data)
-        result = enhanced_result
-    else:
-        # Fall back to standard pipeline
-        result = query_or_recommend(user_input)
+    key = flight_key("run_pipeline", {"input": user_input, "question": user_question, "geometry": geometry_data})
+    return pipeline_flight.do(key, lambda: _run_pipeline(user_input, user_question, geometry_data))
+
+def _run_pipeline(user_input: dict, user_question: str, geometry_data: dict) -> dict:
+    result = compute_result(user_input, geometry_data)
 
     try:
         summary = build_answer(user_question or str(user_input), result)
@@ -44,6 +57,29 @@ def run_pipeline(user_input: dict, user_question: str = "", geometry_data: dict
         "enhanced": GEOMETRY_ML_AVAILABLE and geometry_data is not None
     }
 
+def run_pipeline_stream(user_input: dict, user_question: str = "", geometry_data: dict = None):
+    """
+    Streaming run_pipeline: yields (event, data) pairs.
+    "result" comes first, as soon as the score is ready, then one "token" per LLM
+    text delta, then "done" with the full summary (or "error" if the LLM fails).
+    """
+    user_input = standardize_input(user_input)
+    result = compute_result(user_input, geometry_data)
+    yield "result", {
+        "input": user_input,
+        "result": result,
+        "enhanced": GEOMETRY_ML_AVAILABLE and geometry_data is not None
+    }
+
+    parts = []
+    try:
+        for token in build_answer_stream(user_question or str(user_input), result):
+            parts.append(token)
+            yield "token", token
+    except Exception as e:
+        yield "error", f"[LLM Summary Error] {e}"
+    yield "done", {"summary": "".join(parts).strip()}
+
 def run_enhanced_pipeline(user_input: dict, geometry_data: dict) -> dict:
     """
     Run enhanced pipeline using geometry data for more accurate predictions
@@ -96,13 +132,13 @@ def run_from_free_text(question: str, geometry_data: dict = None) -> dict:
     Now supports geometry data for enhanced predictions.
     """
     user_input = extract_variables(question)
-    if not user_input:
+    if not is_structured(user_input):
         return {"error": "Could not extract parameters from question."}
     return run_pipeline(user_input, question, geometry_data)
 
 def run_from_free_text(question, geometry_data=None):
     extracted = extract_variables(question)
-    if not extracted:
+    if not is_structured(extracted):
         return {"error": "Both zone and apartment_type are required"}
     
     return run_pipeline(extracted, question, geometry_data)
\ No newline at end of file
@@ -0,0 +1,149 @@
+# compiled_scorer.py
+
+"""
+Pandas-free scoring path for the saved comfort pipeline.
+
+The fitted preprocessing (KNNImputer valid-column mask, StandardScaler mean/scale,
+OneHotEncoder vocabularies) is extracted from the pipeline once. A feature dict is then
+encoded straight into a preallocated NumPy row and handed to the XGBoost booster, skipping
+DataFrame construction, dtype coercion and the ColumnTransformer on every call.
+
+Inputs follow the same coercion rules as recommend_recompute.prepare_model_frame:
+categoricals are str()'d, numerics that cannot be parsed become 0. Since no NaN ever
+reaches the imputer, KNN imputation is an identity and the output matches
+pipeline.predict exactly; compile_scorer() verifies this and returns None when the
+pipeline layout is not one it can reproduce.
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+
+
+class CompiledScorer:
+    def __init__(self, pipeline):
+        preprocessor = pipeline.steps[0][1]
+        self.regressor = pipeline.steps[-1][1]
+        self.booster = self.regressor.get_booster()
+        self.input_columns = list(pipeline.feature_names_in_)
+
+        self.numeric_columns = []
+        self.mean = None
+        self.scale = None
+        self.categorical_columns = []
+        self.category_offsets = []
+        offset = 0
+        for name, transformer, columns in preprocessor.transformers_:
+            columns = list(columns)
+            if name == 'remainder' or transformer == 'drop' or not columns:
+                continue
+            steps = dict(transformer.steps)
+            if 'scaler' in steps:
+                imputer = steps['imputer']
+                valid_mask = getattr(imputer, '_valid_mask', np.ones(len(columns), dtype=bool))
+                kept = [col for col, keep in zip(columns, valid_mask) if keep]
+                scaler = steps['scaler']
+                self.numeric_columns = kept
+                self.mean = np.asarray(scaler.mean_ if scaler.with_mean else np.zeros(len(kept)), dtype=np.float64)
+                self.scale = np.asarray(scaler.scale_ if scaler.with_std else np.ones(len(kept)), dtype=np.float64)
+                self.numeric_slice = slice(offset, offset + len(kept))
+                offset += len(kept)
+            elif 'encoder' in steps:
+                encoder = steps['encoder']
+                if encoder.drop_idx_ is not None:
+                    raise ValueError("OneHotEncoder with drop is not supported")
+                for col, categories in zip(columns, encoder.categories_):
+                    self.categorical_columns.append(col)
+                    self.category_offsets.append({str(cat): offset + i for i, cat in enumerate(categories)})
+                    offset += len(categories)
+            else:
+                raise ValueError(f"Unsupported transformer in pipeline: {name}")
+        self.n_outputs = offset
+
+        # Mirror XGBModel.predict: honour early-stopping best_iteration when present
+        self.iteration_range = (0, self.regressor.best_iteration + 1) if hasattr(self.regressor, 'best_iteration') else (0, 0)
+        self.missing = self.regressor.missing
+
+    @staticmethod
+    def _to_float(value):
+        # Same outcome as pd.to_numeric(errors='coerce').fillna(0)
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return 0.0
+        return 0.0 if math.isnan(value) else value
+
+    def encode(self, features, out):
+        """
+        Writes one feature dict into a zeroed output row (raises KeyError on missing features).
+        """
+        numeric = np.fromiter((self._to_float(features[col]) for col in self.numeric_columns),
+                              dtype=np.float64, count=len(self.numeric_columns))
+        out[self.numeric_slice] = (numeric - self.mean) / self.scale
+        for col, offsets in zip(self.categorical_columns, self.category_offsets):
+            index = offsets.get(str(features[col]))
+            if index is not None:  # handle_unknown='ignore' -> all zeros
+                out[index] = 1.0
+        return out
+
+    def encode_many(self, rows):
+        X = np.zeros((len(rows), self.n_outputs), dtype=np.float64)
+        for i, features in enumerate(rows):
+            self.encode(features, X[i])
+        return X
+
+    def predict_many(self, rows):
+        """
+        Scores a list of feature dicts with one booster call.
+        """
+        if isinstance(rows, pd.DataFrame):
+            rows = rows.to_dict(orient='records')
+        if not rows:
+            return np.zeros(0, dtype=np.float32)
+        X = self.encode_many(rows)
+        return self.booster.inplace_predict(X, iteration_range=self.iteration_range, missing=self.missing)
+
+    def predict_one(self, features):
+        return float(self.predict_many([features])[0])
+
+
+def _probe_rows(scorer, columns=()):
+    """
+    Synthetic rows spanning every category (plus an unseen one) and a spread of numerics.
+    columns lists any extra keys prepare_frame expects (zero-filled).
+    """
+    rows = []
+    spread = [-2.0, -0.5, 0.0, 0.7, 3.0]
+    width = max(len(offsets) for offsets in scorer.category_offsets) + 1
+    for i in range(width):
+        row = {col: 0.0 for col in list(columns) + scorer.input_columns}
+        for col, offsets in zip(scorer.categorical_columns, scorer.category_offsets):
+            categories = list(offsets)
+            row[col] = categories[i] if i < len(categories) else "Unknown"
+        for j, col in enumerate(scorer.numeric_columns):
+            row[col] = float(scorer.mean[j] + spread[(i + j) % len(spread)] * scorer.scale[j])
+        rows.append(row)
+    return rows
+
+
+def compile_scorer(pipeline, prepare_frame, columns=()):
+    """
+    Builds a CompiledScorer and checks it against pipeline.predict on probe rows.
+    prepare_frame is the usual DataFrame builder used for the pipeline path and
+    columns the full feature layout it selects.
+    Returns None (callers keep using pipeline.predict) if anything does not match.
+    """
+    try:
+        scorer = CompiledScorer(pipeline)
+        probes = _probe_rows(scorer, columns)
+        expected = pipeline.predict(prepare_frame(probes))
+        actual = scorer.predict_many(probes)
+        if not np.array_equal(np.asarray(expected), np.asarray(actual)):
+            print("⚠️ Compiled scorer does not match pipeline.predict - using the pipeline")
+            return None
+        print("✅ Compiled scorer ready")
+        return scorer
+    except Exception as e:
+        print(f"⚠️ Compiled scorer unavailable ({e}) - using the pipeline")
+        return None
@@ -10,6 +10,7 @@ from typing import Dict, List, Optional, Any
 import joblib
 import os
 import sys
+import threading
 
 # Add project root to allow importing from utils
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -22,13 +23,26 @@ class GeometryMLInterface:
     """
     
     def __init__(self):
-        """Initialize the interface with ML models"""
-        self.comfort_model = None
+        """Initialize the interface; ML models are loaded on first use (or by server warmup)"""
+        self._comfort_model = None
         self.acoustic_model = None
-        self.load_models()
-        
+        self.models_loaded = False
+        self._load_lock = threading.Lock()
+
+    @property
+    def comfort_model(self):
+        if not self.models_loaded:
+            self.load_models()
+        return self._comfort_model
+
     def load_models(self):
-        """Load trained ML models"""
+        """Load trained ML models (once)"""
+        with self._load_lock:
+            if not self.models_loaded:
+                self._load_models()
+                self.models_loaded = True
+
+    def _load_models(self):
         try:
             # Load comfort prediction model - use the specific model requested
             model_paths = [
@@ -39,7 +53,7 @@ class GeometryMLInterface:
             
             for model_path in model_paths:
                 if os.path.exists(model_path):
-                    self.comfort_model = joblib.load(model_path)
+                    self._comfort_model = joblib.load(model_path)
                     print(f"✅ Comfort model loaded successfully from: {model_path}")
                     break
             else:
@@ -48,7 +62,7 @@ class GeometryMLInterface:
                     print(f"   - {path}")
                 
             # Use the same model for acoustic analysis (since they're the same type)
-            self.acoustic_model = self.comfort_model
+            self.acoustic_model = self._comfort_model
             if self.acoustic_model:
                 print(f"✅ Acoustic model set to same model: ecoform_xgb_comfort_model1.pkl")
             else:
@@ -4,7 +4,9 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 import json
 import numpy as np
-from server.config import client, embedding_model, completion_model
+from server.config import client, async_client, embedding_model, llm_backend
+from utils.metrics import span, timed
+from utils.llm_cache import cached_completion, cached_completion_async
 
 # Load vectorized guidance
 with open("knowledge/compliance_guidance_vectors.json", "r", encoding="utf-8") as f:
@@ -13,7 +15,11 @@ with open("knowledge/compliance_guidance_vectors.json", "r", encoding="utf-8") a
 vectors = np.array([entry["vector"] for entry in vector_data])
 texts = [entry["content"] for entry in vector_data]
 
+# Embeddings stay on the default backend (the stored vectors were made with it)
+guidance_llm = llm_backend("guidance")
+
 # Embed the user query
+@timed("embedding")
 def embed_query(text: str):
     response = client.embeddings.create(input=[text], model=embedding_model)
     return response.data[0].embedding
@@ -21,14 +27,16 @@ def embed_query(text: str):
 def cosine_similarity(v1, v2):
     return np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2))
 
-def get_relevant_guidance(user_query: str):
-    q_vec = embed_query(user_query)
+def best_guidance(q_vec):
     sims = [cosine_similarity(q_vec, v) for v in vectors]
     top_idx = int(np.argmax(sims))
     return texts[top_idx]
 
-def explain_guidance(user_query: str, guidance_text: str) -> str:
-    messages = [
+def get_relevant_guidance(user_query: str):
+    return best_guidance(embed_query(user_query))
+
+def guidance_messages(user_query: str, guidance_text: str) -> list:
+    return [
         {
             "role": "system",
             "content": "You are an acoustic design expert explaining compliance guidance for buildings."
@@ -38,12 +46,20 @@ def explain_guidance(user_query: str, guidance_text: str) -> str:
             "content": f"My question: {user_query}\n\nMatched guidance: {guidance_text}"
         }
     ]
-    response = client.chat.completions.create(
-        model=completion_model,
-        messages=messages
-    )
-    return response.choices[0].message.content.strip()
+
+@timed("llm_guidance")
+def explain_guidance(user_query: str, guidance_text: str) -> str:
+    return cached_completion(guidance_llm.client, guidance_llm.completion_model, guidance_messages(user_query, guidance_text)).strip()
 
 def handle_llm_query(user_query: str):
     guidance = get_relevant_guidance(user_query)
-    return explain_guidance(user_query, guidance)
\ No newline at end of file
+    return explain_guidance(user_query, guidance)
+
+# === Async variant for the API server ===
+async def handle_llm_query_async(user_query: str):
+    with span("embedding"):
+        response = await async_client.embeddings.create(input=[user_query], model=embedding_model)
+    guidance = best_guidance(response.data[0].embedding)
+    with span("llm_guidance"):
+        content = await cached_completion_async(guidance_llm.async_client, guidance_llm.completion_model, guidance_messages(user_query, guidance))
+    return content.strip()
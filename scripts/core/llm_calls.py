@@ -8,16 +8,26 @@ import ast  # safer than eval
 # ✅ Path hack to ensure imports work inside Cursor
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from server.config import client, completion_model
-
-# 🔹 Extract structured variables from free-form question
-def extract_variables(user_question: str) -> dict:
-    response = client.chat.completions.create(
-        model=completion_model,
-        messages=[
-            {
-                "role": "system",
-                "content": """
+from server.config import llm_backend
+from utils.metrics import metrics, span, timed
+from utils import rule_extractor
+from utils.semantic_cache import get_semantic_cache
+from utils.llm_cache import llm_cache, cached_completion, cached_completion_async
+
+metrics.register_collector("extractor", rule_extractor.stats)
+
+# Reworded questions reuse earlier answers; namespaced per call type and model
+semantic_cache = get_semantic_cache()
+metrics.register_collector("semantic_cache", semantic_cache.stats)
+metrics.register_collector("llm_cache", llm_cache.stats)
+# Backend per call site (AI25_LLM_BACKEND_EXTRACT / _SUMMARY); clients are built on first use
+extract_llm = llm_backend("extract")
+summary_llm = llm_backend("summary")
+
+EXTRACT_NAMESPACE = f"extract:{extract_llm.completion_model}"
+SUMMARY_NAMESPACE = f"summary:{summary_llm.completion_model}"
+
+EXTRACT_SYSTEM_PROMPT = """
 You are an assistant for acoustic comfort evaluation.
 
 Your job is to extract structured inputs from user questions.
@@ -33,30 +43,42 @@ Return ONLY a valid Python dictionary.
 Omit fields if not mentioned.
 Return no explanations.
 """
-            },
-            {
-                "role": "user",
-                "content": f"User Question: {user_question}"
-            }
-        ]
-    )
 
+SUMMARY_SYSTEM_PROMPT = """
+You summarize acoustic comfort evaluations for architects and sustainability consultants.
+
+Instructions:
+- Do not repeat sentences.
+- Clearly state compliance.
+- If material upgrades are provided, summarize them usefully.
+- Use bullets for clarity if needed.
+- If compliant, avoid unnecessary suggestions.
+"""
+
+# === Prompt builders (shared by the sync and async calls) ===
+def extraction_messages(user_question: str, fields: list = None) -> list:
+    system = EXTRACT_SYSTEM_PROMPT
+    if fields:
+        # The rule-based extractor already resolved the rest
+        system += f"\nOnly extract these fields: {', '.join(fields)}\n"
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": f"User Question: {user_question}"}
+    ]
+
+def parse_variables(content: str) -> dict:
     try:
-        content = response.choices[0].message.content.strip()
         # ✅ Safer parsing instead of eval
-        variables = ast.literal_eval(content)
-        return variables
+        return ast.literal_eval(content.strip())
     except Exception as e:
         print("⚠️ Extraction failed:", e)
         return {}
 
-# 🔹 Summarize acoustic score + compliance + recommendations
-def build_answer(user_question: str, result: dict) -> str:
+def summary_messages(user_question: str, result: dict) -> list:
     score = result.get("comfort_score")
     source = result.get("source", "N/A")
     compliance = result.get("compliance", {})
     recommendations = result.get("recommendations", {})
-    improved_score = result.get("improved_score", None)
 
     best_materials = result.get("best_materials", {})
     best_score = result.get("best_score", None)
@@ -77,28 +99,131 @@ User Question:
 {best_materials if best_materials else "No upgrades suggested"}
 Improved Score: {round(best_score, 3) if best_score else "N/A"}
 """
+    return [
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {"role": "user", "content": summary_prompt}
+    ]
+
+# A scenario can only be scored with both of these; the other fields refine it
+REQUIRED_FIELDS = ("zone", "apartment_type")
+# Fields that only qualify a scenario ("at night", "for sleeping") and never make one on their own
+CONTEXT_FIELDS = {"time_period", "activity"}
+
+def is_structured(user_input: dict) -> bool:
+    """
+    True when the extracted input names a scenario query_or_recommend can score.
+    """
+    return bool(user_input) and all(user_input.get(field) for field in REQUIRED_FIELDS)
+
+def _finish_extraction(extraction, llm_fields=None) -> dict:
+    rule_extractor.record(extraction, llm_fields)
+    metrics.inc("extractions_total", path="rules+llm" if extraction.needs_llm else "rules")
+    merged = extraction.merge(llm_fields)
+    # "How loud is a door slam at night?" is a general question, not a scenario
+    return merged if set(merged) - CONTEXT_FIELDS else {}
+
+def _extraction_key(extraction) -> dict:
+    # A cached LLM extraction only applies when the rules read the question the same way
+    return {"rules": extraction.fields, "fields": extraction.unresolved}
 
-    response = client.chat.completions.create(
-        model=completion_model,
-        messages=[
-            {
-                "role": "system",
-                "content": """
-You summarize acoustic comfort evaluations for architects and sustainability consultants.
+# 🔹 Extract structured variables from free-form question
+def extract_variables(user_question: str) -> dict:
+    """
+    Rule-based extraction first; the LLM is only asked for fields the question
+    mentions but the rules could not resolve.
+    """
+    extraction = rule_extractor.extract(user_question)
+    if not extraction.needs_llm:
+        return _finish_extraction(extraction)
+    key = _extraction_key(extraction)
+    llm_fields = semantic_cache.get(EXTRACT_NAMESPACE, user_question, key)
+    if llm_fields is None:
+        llm_fields = llm_extract_variables(user_question, extraction.unresolved)
+        semantic_cache.set(EXTRACT_NAMESPACE, user_question, llm_fields, key)
+    return _finish_extraction(extraction, llm_fields)
+
+@timed("llm_extract")
+def llm_extract_variables(user_question: str, fields: list = None) -> dict:
+    content = cached_completion(extract_llm.client, extract_llm.completion_model, extraction_messages(user_question, fields))
+    return parse_variables(content)
 
-Instructions:
-- Do not repeat sentences.
-- Clearly state compliance.
-- If material upgrades are provided, summarize them usefully.
-- Use bullets for clarity if needed.
-- If compliant, avoid unnecessary suggestions.
-"""
-            },
-            {
-                "role": "user",
-                "content": summary_prompt
-            }
-        ]
-    )
-
-    return response.choices[0].message.content.strip()
+# 🔹 Summarize acoustic score + compliance + recommendations
+def build_answer(user_question: str, result: dict) -> str:
+    cached = semantic_cache.get(SUMMARY_NAMESPACE, user_question, result)
+    if cached is not None:
+        return cached
+    answer = llm_build_answer(user_question, result)
+    semantic_cache.set(SUMMARY_NAMESPACE, user_question, answer, result)
+    return answer
+
+@timed("llm_summary")
+def llm_build_answer(user_question: str, result: dict) -> str:
+    return cached_completion(summary_llm.client, summary_llm.completion_model, summary_messages(user_question, result)).strip()
+
+# 🔹 Same summary, streamed: yields text deltas as the model produces them
+def build_answer_stream(user_question: str, result: dict):
+    cached = semantic_cache.get(SUMMARY_NAMESPACE, user_question, result)
+    if cached is not None:
+        yield cached
+        return
+    parts = []
+    with span("llm_summary_stream"):
+        stream = summary_llm.client.chat.completions.create(
+            model=summary_llm.completion_model,
+            messages=summary_messages(user_question, result),
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+    # Only complete answers are cached (a client that disconnects stops the generator above)
+    semantic_cache.set(SUMMARY_NAMESPACE, user_question, "".join(parts).strip(), result)
+
+# === Async variants for the API server ===
+async def extract_variables_async(user_question: str) -> dict:
+    extraction = rule_extractor.extract(user_question)
+    if not extraction.needs_llm:
+        return _finish_extraction(extraction)
+    key = _extraction_key(extraction)
+    llm_fields = semantic_cache.get(EXTRACT_NAMESPACE, user_question, key)
+    if llm_fields is None:
+        llm_fields = await llm_extract_variables_async(user_question, extraction.unresolved)
+        semantic_cache.set(EXTRACT_NAMESPACE, user_question, llm_fields, key)
+    return _finish_extraction(extraction, llm_fields)
+
+@timed("llm_extract")
+async def llm_extract_variables_async(user_question: str, fields: list = None) -> dict:
+    content = await cached_completion_async(extract_llm.async_client, extract_llm.completion_model, extraction_messages(user_question, fields))
+    return parse_variables(content)
+
+async def build_answer_async(user_question: str, result: dict) -> str:
+    cached = semantic_cache.get(SUMMARY_NAMESPACE, user_question, result)
+    if cached is not None:
+        return cached
+    answer = await llm_build_answer_async(user_question, result)
+    semantic_cache.set(SUMMARY_NAMESPACE, user_question, answer, result)
+    return answer
+
+@timed("llm_summary")
+async def llm_build_answer_async(user_question: str, result: dict) -> str:
+    content = await cached_completion_async(summary_llm.async_client, summary_llm.completion_model, summary_messages(user_question, result))
+    return content.strip()
+
+async def build_answer_stream_async(user_question: str, result: dict):
+    cached = semantic_cache.get(SUMMARY_NAMESPACE, user_question, result)
+    if cached is not None:
+        yield cached
+        return
+    parts = []
+    with span("llm_summary_stream"):
+        stream = await summary_llm.async_client.chat.completions.create(
+            model=summary_llm.completion_model,
+            messages=summary_messages(user_question, result),
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+    semantic_cache.set(SUMMARY_NAMESPACE, user_question, "".join(parts).strip(), result)
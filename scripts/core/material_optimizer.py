@@ -0,0 +1,131 @@
+# material_optimizer.py
+
+"""
+What-if search over material upgrades.
+
+Every combination of wall x window x floor x door choices from material_directory
+("keep" plus each alternative) is turned into an adjusted feature row (see
+utils/material_effects.py) and scored in a single batched predict. The result is the
+Pareto front of comfort score vs. number of changed elements, i.e. the best plan with
+one change, with two changes, ... as long as each extra change actually pays off.
+"""
+
+import itertools
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from utils.infer_from_inputs import infer_features
+from utils.material_effects import (
+    ELEMENT_TYPES, apply_material_changes, canonical_material, material_coefficient
+)
+from utils.metrics import timed
+from utils.reference_data import material_directory
+from scripts.core.recommend_recompute import (
+    parse_user_input, _infer_kwargs, predict_scores, prediction_cache
+)
+
+# Keys a client can use to say what is installed now
+CURRENT_MATERIAL_KEYS = {
+    'wall': 'wall_material',
+    'window': 'window_material',
+    'floor': 'floor_material',
+    'door': 'door_material',
+}
+
+
+def current_materials(user_input):
+    return {element: canonical_material(element, user_input.get(key)) for element, key in CURRENT_MATERIAL_KEYS.items()}
+
+
+def candidate_changes(current, elements=ELEMENT_TYPES, max_changes=None):
+    """
+    Yields {element: new_material} dicts for every combination ("keep" = absent).
+    """
+    options = []
+    for element in elements:
+        choices = [name for _, name in material_directory[element] if name != current.get(element)]
+        options.append([None] + choices)
+    for combo in itertools.product(*options):
+        changes = {element: name for element, name in zip(elements, combo) if name is not None}
+        if max_changes is None or len(changes) <= max_changes:
+            yield changes
+
+
+def pareto_front(plans):
+    """
+    Best plan per number of changes, kept only if it beats every plan with fewer changes.
+    """
+    best_per_count = {}
+    for plan in plans:
+        count = plan["n_changes"]
+        if count not in best_per_count or plan["comfort_score"] > best_per_count[count]["comfort_score"]:
+            best_per_count[count] = plan
+    front = []
+    for count in sorted(best_per_count):
+        plan = best_per_count[count]
+        if not front or plan["comfort_score"] > front[-1]["comfort_score"]:
+            front.append(plan)
+    return front
+
+
+def optimize_materials(user_input, elements=None, max_changes=None):
+    """
+    Returns the baseline score and the Pareto front of upgrade plans for one scenario.
+    Raises ValueError for inputs without zone / apartment type.
+    """
+    elements = [e for e in (elements or ELEMENT_TYPES) if e in ELEMENT_TYPES]
+    user_input, _ = parse_user_input(user_input)
+    payload = {"input": user_input, "elements": elements, "max_changes": max_changes}
+    return prediction_cache.get_or_compute(
+        "optimize_materials", payload, lambda: _optimize_materials(user_input, elements, max_changes)
+    )
+
+
+@timed("optimize_materials")
+def _optimize_materials(user_input, elements, max_changes):
+    user_input, params = parse_user_input(user_input)
+    features, tier = infer_features(element_material=params["wall_material"], **_infer_kwargs(params))
+    current = current_materials(user_input)
+
+    changes_list = list(candidate_changes(current, elements, max_changes))
+    rows = [apply_material_changes(features, current, changes) for changes in changes_list]
+    scores = predict_scores(rows)
+    print(f"✅ Scored {len(rows)} material combinations in one batch")
+
+    baseline = round(float(scores[0]), 3)  # first combination keeps everything
+    plans = []
+    for changes, row, score in zip(changes_list, rows, scores):
+        score = round(float(score), 3)
+        plans.append({
+            "changes": {
+                element: {
+                    "from": current.get(element),
+                    "to": name,
+                    "absorption": material_coefficient(element, name),
+                }
+                for element, name in changes.items()
+            },
+            "n_changes": len(changes),
+            "comfort_score": score,
+            "improvement": round(score - baseline, 3),
+            "rt60_s": row.get("rt60_s"),
+            "laeq_db": row.get("laeq_db"),
+        })
+
+    front = pareto_front(plans)
+    return {
+        "source": f"Inference Tier: {tier}",
+        "current_materials": current,
+        "baseline_score": baseline,
+        "candidates_evaluated": len(plans),
+        "pareto_front": front,
+        "best_plan": front[-1] if front else None,
+    }
+
+
+if __name__ == "__main__":
+    import json
+    example = {"zone": "HD-Urban-V1", "apartment_type": "2Bed", "wall_material": "Painted Brick", "activity": "Sleeping"}
+    print(json.dumps(optimize_materials(example), indent=2))
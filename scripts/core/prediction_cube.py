@@ -0,0 +1,299 @@
+# prediction_cube.py
+
+"""
+Precomputed prediction cube over the categorical input space.
+
+The offline build evaluates the comfort model over every combination of
+zone x apartment type x day/night x floor level x wall x window material
+(DAY_RANGES zones, material_directory walls/windows, "unspecified" included for
+floor/wall/window) in vectorized batches and stores the scores in an indexed
+SQLite table. Activity is not a cube dimension: it only selects the compliance
+threshold, which is applied at lookup time.
+
+Build (or rebuild after retraining the model / changing the dataset) with:
+    python scripts/core/prediction_cube.py [max_floor]
+"""
+
+import itertools
+import os
+import sqlite3
+import sys
+import threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from utils.reference_data import DAY_RANGES, material_directory
+from utils.infer_from_inputs import resolve_day_night, DATA_PATH
+from utils.dataset_snapshot import source_signature
+from utils.prediction_cache import file_fingerprint
+from utils.format_interpreter import standardize_input
+from scripts.core.recommend_recompute import (
+    MODEL_PATH, model, score_scenarios, build_result, find_wall_upgrade, load_guidance
+)
+
+CUBE_PATH = "sql/prediction-cube.db"
+CUBE_VERSION = "2"
+MAX_FLOOR = 10
+BATCH_SIZE = 10000
+
+APARTMENT_TYPES = ["1Bed", "2Bed", "3Bed"]
+PERIODS = ["day", "night"]
+# Sentinel for "not given": NULLs make poor primary key members
+UNSPECIFIED_FLOOR = -1
+UNSPECIFIED_MATERIAL = ""
+
+# Only these inputs are cube dimensions (or applied at lookup); anything else is a
+# continuous override (IFC geometry, measured LAeq/RT60, ...) and goes to live inference
+CUBE_INPUT_KEYS = {
+    "zone_string", "apartment_type_string", "element_materials_string",
+    "wall_material", "window_material", "floor_level", "activity", "time_period",
+}
+
+# Stored so build_result can rebuild compliance without the full feature vector
+STORED_FEATURES = ["laeq_db", "rt60_s", "spl_db", "absorption_coefficient_by_area_m", "total_surface_sqm"]
+
+
+def cube_signature():
+    """
+    What the cube was computed from; a mismatch means it must be rebuilt.
+    """
+    dataset = source_signature(DATA_PATH)
+    return {
+        "cube_version": CUBE_VERSION,
+        "model_sha256": file_fingerprint(MODEL_PATH),
+        "dataset_size": str(dataset["size"]),
+        "dataset_mtime_ns": str(dataset["mtime_ns"]),
+    }
+
+
+def compose_element_string(wall_material, window_material):
+    """
+    Element string in the same "Wall: ...; Window: ..." form main.py builds.
+    """
+    parts = []
+    if wall_material:
+        parts.append(f"Wall: {wall_material}")
+    if window_material:
+        parts.append(f"Window: {window_material}")
+    return "; ".join(parts) if parts else None
+
+
+def _known_element_strings():
+    """
+    element_materials_string categories the fitted one-hot encoder knows, or None if the
+    pipeline layout is not recognised.
+    """
+    try:
+        preprocessor = model.steps[0][1]
+        for _, transformer, columns in preprocessor.transformers_:
+            if 'element_materials_string' in list(columns):
+                encoder = transformer.steps[-1][1] if hasattr(transformer, 'steps') else transformer
+                return set(encoder.categories_[list(columns).index('element_materials_string')])
+    except Exception as e:
+        print(f"⚠️ Could not read encoder categories: {e}")
+    return None
+
+
+def _material_names(material_type):
+    return [name for _, name in material_directory[material_type]]
+
+
+def _scenario_params(zone, apartment_type, period, floor, wall, window):
+    wall = wall or None
+    window = window or None
+    return {
+        "zone": zone,
+        "apartment_type": apartment_type,
+        "element_material": compose_element_string(wall, window),
+        "wall_material": wall,
+        "window_material": window,
+        "floor_level": None if floor == UNSPECIFIED_FLOOR else floor,
+        "activity": "Living",
+        "period": period,
+    }
+
+
+# === Offline build ===
+def build_cube(cube_path=CUBE_PATH, max_floor=MAX_FLOOR, batch_size=BATCH_SIZE):
+    floors = [UNSPECIFIED_FLOOR] + list(range(1, max_floor + 1))
+    walls = [UNSPECIFIED_MATERIAL] + _material_names('wall')
+    windows = [UNSPECIFIED_MATERIAL] + _material_names('window')
+    keys = list(itertools.product(DAY_RANGES.keys(), APARTMENT_TYPES, PERIODS, floors, walls, windows))
+    print(f"🧊 Building prediction cube: {len(keys)} scenarios -> {cube_path}")
+
+    tmp_path = cube_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.execute("CREATE TABLE cube_meta (key TEXT PRIMARY KEY, value TEXT)")
+    conn.execute(f"""
+        CREATE TABLE prediction_cube (
+            zone_string TEXT,
+            apartment_type_string TEXT,
+            day_night TEXT,
+            floor_level INTEGER,
+            wall_material TEXT,
+            window_material TEXT,
+            comfort_score REAL,
+            improved_score REAL,
+            tier TEXT,
+            {', '.join(f'"{col}" REAL' for col in STORED_FEATURES)},
+            PRIMARY KEY (zone_string, apartment_type_string, day_night, floor_level, wall_material, window_material)
+        ) WITHOUT ROWID
+    """)
+
+    insert_sql = f"INSERT INTO prediction_cube VALUES ({', '.join(['?'] * (9 + len(STORED_FEATURES)))})"
+    for start in range(0, len(keys), batch_size):
+        chunk = keys[start:start + batch_size]
+        scored = score_scenarios([_scenario_params(*key) for key in chunk])
+        rows = []
+        for key, (features, tier, comfort_score, _, _, improved_score) in zip(chunk, scored):
+            rows.append(key + (comfort_score, improved_score, tier) + tuple(float(features[col]) for col in STORED_FEATURES))
+        with conn:
+            conn.executemany(insert_sql, rows)
+        print(f"🧊 {min(start + batch_size, len(keys))}/{len(keys)} scenarios scored")
+
+    # A missing element string is inferred as 'Unknown'. If neither that nor any composed
+    # "Wall: ...; Window: ..." string is a training category, both one-hot encode to zeros
+    # and inputs without an element string can be answered from the same rows
+    known = _known_element_strings()
+    composed = {compose_element_string(w or None, g or None) for w in walls for g in windows} | {'Unknown'}
+    element_optional = known is not None and not (composed & known)
+
+    with conn:
+        conn.executemany(
+            "INSERT INTO cube_meta VALUES (?, ?)",
+            list(cube_signature().items()) + [
+                ("max_floor", str(max_floor)),
+                ("element_optional", "1" if element_optional else "0"),
+            ]
+        )
+    conn.close()
+    os.replace(tmp_path, cube_path)
+    print(f"✅ Prediction cube written: {cube_path}")
+
+
+# === Lookup ===
+class PredictionCube:
+    """
+    Read-only access to a built cube. Disabled (lookup returns None) when the cube is
+    missing or was built from a different model pickle or dataset.
+    """
+
+    def __init__(self, cube_path=CUBE_PATH):
+        self.cube_path = cube_path
+        self.conn = None
+        self.max_floor = 0
+        self.element_optional = False
+        self.lock = threading.Lock()
+        self.guidance = None
+        self.wall_names = {name.lower(): name for name in _material_names('wall')}
+        self.window_names = {name.lower(): name for name in _material_names('window')}
+        self._open()
+
+    def _open(self):
+        if not os.path.exists(self.cube_path):
+            print(f"⚠️ Prediction cube not found ({self.cube_path}) - using live inference")
+            return
+        try:
+            conn = sqlite3.connect(f"file:{os.path.abspath(self.cube_path)}?mode=ro", uri=True, check_same_thread=False)
+            meta = dict(conn.execute("SELECT key, value FROM cube_meta"))
+            expected = cube_signature()
+            if any(meta.get(k) != v for k, v in expected.items()):
+                print("⚠️ Prediction cube is stale (model or dataset changed) - using live inference")
+                conn.close()
+                return
+            self.max_floor = int(meta.get("max_floor", 0))
+            self.element_optional = meta.get("element_optional") == "1"
+            self.conn = conn
+            print(f"✅ Prediction cube loaded: {self.cube_path}")
+        except Exception as e:
+            print(f"⚠️ Could not open prediction cube: {e}")
+
+    def _key(self, user_input):
+        """
+        Maps a standardized user input onto a cube key, or None if it is outside the cube.
+        """
+        if set(user_input) - CUBE_INPUT_KEYS:
+            return None
+        zone = user_input.get("zone_string")
+        apartment_type = user_input.get("apartment_type_string")
+        if zone not in DAY_RANGES or apartment_type not in APARTMENT_TYPES:
+            return None
+
+        floor = user_input.get("floor_level")
+        if floor is None:
+            floor = UNSPECIFIED_FLOOR
+        else:
+            try:
+                floor_value = float(floor)
+            except (TypeError, ValueError):
+                return None
+            if not floor_value.is_integer() or not 1 <= floor_value <= self.max_floor:
+                return None
+            floor = int(floor_value)
+
+        wall = user_input.get("wall_material")
+        window = user_input.get("window_material")
+        if wall is not None and str(wall).lower() not in self.wall_names:
+            return None
+        if window is not None and str(window).lower() not in self.window_names:
+            return None
+        wall = self.wall_names[str(wall).lower()] if wall is not None else UNSPECIFIED_MATERIAL
+        window = self.window_names[str(window).lower()] if window is not None else UNSPECIFIED_MATERIAL
+
+        # The cube was scored with the composed element string (or none at all)
+        element = user_input.get("element_materials_string")
+        if element != compose_element_string(wall, window) and not (element is None and self.element_optional):
+            return None
+
+        period = resolve_day_night(user_input.get("time_period", "day"))
+        return (zone, apartment_type, period, floor, wall, window)
+
+    def lookup(self, user_input):
+        """
+        Returns the same result dict recommend_recompute would, or None on a cube miss.
+        """
+        if self.conn is None:
+            return None
+        user_input = standardize_input(user_input)
+        key = self._key(user_input)
+        if key is None:
+            return None
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT comfort_score, improved_score, tier, "
+                + ", ".join(f'"{col}"' for col in STORED_FEATURES)
+                + " FROM prediction_cube WHERE zone_string = ? AND apartment_type_string = ? AND day_night = ?"
+                " AND floor_level = ? AND wall_material = ? AND window_material = ?",
+                key,
+            ).fetchone()
+            if self.guidance is None:
+                self.guidance = load_guidance()
+        if row is None:
+            return None
+
+        comfort_score, improved_score, tier = row[:3]
+        features = dict(zip(STORED_FEATURES, row[3:]))
+        params = {
+            "zone": key[0],
+            "activity": user_input.get("activity", "Living"),
+            "period": user_input.get("time_period", "day"),
+        }
+        current_wall, best_wall = find_wall_upgrade(user_input.get("wall_material"), features)
+        return build_result(params, features, tier, comfort_score, current_wall, best_wall, improved_score, self.guidance)
+
+
+_cube = None
+_cube_lock = threading.Lock()
+
+def get_prediction_cube():
+    global _cube
+    with _cube_lock:
+        if _cube is None:
+            _cube = PredictionCube()
+    return _cube
+
+
+if __name__ == "__main__":
+    build_cube(max_floor=int(sys.argv[1]) if len(sys.argv) > 1 else MAX_FLOOR)
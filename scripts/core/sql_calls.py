@@ -1,18 +1,45 @@
 # sql_calls.py
 
-import sqlite3
-import pandas as pd
 import os
+import re
 import sys
 
 # ✅ Allow relative imports
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from utils.format_interpreter import standardize_input
-from scripts.core.recommend_recompute import recommend_recompute
+from scripts.core.recommend_recompute import (
+    recommend_recompute, recommend_recompute_batch, prediction_cache, predict_scores, numeric_features,
+    parse_user_input, find_wall_upgrade, build_result, load_guidance, rules
+)
+from scripts.core.prediction_cube import get_prediction_cube
+from utils.prediction_cache import file_fingerprint
+from utils.sqlite_pool import get_pool
+from utils.feature_index import clean_key
+from utils.infer_from_inputs import resolve_day_night
+from utils.metrics import metrics, timed
+from utils.material_effects import apply_material_changes
 
 # === Path to SQLite DB ===
 DB_PATH = "sql/comfort-database.db"
+TABLE = "comfort_lookup"
+FTS_TABLE = "comfort_lookup_fts"
+COMFORT_COLUMN = "comfort_index_float"
+DAY_NIGHT_COLUMN = "day/nightstring"
+
+# === ML fallback: precomputed cube first, live inference for everything else ===
+def recommend_from_cube_or_model(user_input):
+    """
+    Answers categorical scenarios from the prediction cube; inputs with continuous
+    overrides (or outside the cube) go through live recommend_recompute.
+    """
+    result = get_prediction_cube().lookup(user_input)
+    if result is not None:
+        print("✅ Answered from prediction cube.")
+        metrics.inc("answers_total", path="cube")
+        return result
+    metrics.inc("answers_total", path="model")
+    return recommend_recompute(user_input)
 
 # === Main SQL Call Function ===
 def query_or_recommend(user_input):
@@ -25,145 +52,357 @@ def query_or_recommend(user_input):
     user_input = standardize_input(user_input)
     print("🔍 Standardized input:", user_input)
 
-    abs_db_path = os.path.abspath(DB_PATH)
-    print(f"🔍 Using database file: {abs_db_path}")
-    conn = sqlite3.connect(abs_db_path)
+    # Identical requests (same dropdowns, same DB/model/dataset) are answered from cache
+    payload = {"input": user_input, "db": file_fingerprint(DB_PATH)}
+    return prediction_cache.get_or_compute(
+        "query_or_recommend", payload, lambda: _query_or_recommend(user_input)
+    )
 
-    # Build WHERE clause — only use what SQL can easily match
+# === SQL lookup ===
+def _lookup_conditions(user_input, pool):
+    """
+    WHERE conditions (column, value) for the keys SQL can match exactly.
+    """
     conditions = []
-    params = []
-
-    # Handle apartment type with more flexibility
     if "apartment_type_string" in user_input:
-        apt_type_clean = user_input["apartment_type_string"].lower().replace(' ', '').replace('-', '')
-        conditions.append("(apartment_type_string_clean = ?)")
-        params.append(apt_type_clean)
-        print(f"🔍 Added apartment type condition (clean): {apt_type_clean}")
-
+        conditions.append(("apartment_type_string_clean", clean_key(user_input["apartment_type_string"])))
     if "zone_string" in user_input:
-        zone_clean = user_input["zone_string"].lower().replace(' ', '').replace('-', '')
-        conditions.append("(zone_string_clean = ?)")
-        params.append(zone_clean)
-        print(f"🔍 Added zone condition (clean): {zone_clean}")
-
-    # Handle element materials with more flexibility
-    if "element_materials_string" in user_input:
-        mat_clean = user_input["element_materials_string"].lower().replace(' ', '').replace('-', '')
-        if 'element_materials_string_clean' in [col[1] for col in conn.execute("PRAGMA table_info(comfort_lookup)")]:
-            conditions.append("(element_materials_string_clean = ?)")
-            params.append(mat_clean)
-            print(f"🔍 Added element materials condition (clean): {mat_clean}")
-
-    # If no minimal keys available, skip SQL entirely
+        conditions.append(("zone_string_clean", clean_key(user_input["zone_string"])))
+    if "element_materials_string" in user_input and pool.has_column(TABLE, "element_materials_string_clean"):
+        conditions.append(("element_materials_string_clean", clean_key(user_input["element_materials_string"])))
+    if conditions and pool.has_column(TABLE, DAY_NIGHT_COLUMN):
+        conditions.append((DAY_NIGHT_COLUMN, resolve_day_night(user_input.get("time_period", "day"))))
+    return conditions
+
+def _select_columns(pool):
+    """
+    Model inputs the table actually has, plus what the result needs.
+    """
+    available = set(pool.columns(TABLE))
+    wanted = ["element_materials_string", DAY_NIGHT_COLUMN, COMFORT_COLUMN] + numeric_features
+    return [col for col in dict.fromkeys(wanted) if col in available]
+
+@timed("sql_lookup")
+def lookup_best_row(user_input):
+    """
+    Highest-comfort comfort_lookup row matching the input's keys, as a dict.
+    Returns None when there is nothing to match on or no row matches.
+    """
+    pool = get_pool(DB_PATH)
+    conditions = _lookup_conditions(user_input, pool)
     if not conditions:
-        print("⚠️ Not enough keys to query SQL — switching to model...")
-        return recommend_recompute(user_input)
-
-    sql_query = f"""
-    SELECT 
-        comfort_index,
-        apartment_type,
-        zone,
-        laeq as laeq_db,
-        rt60 as rt60_s,
-        spl as spl_db,
-        absorption_coefficient_by_area as absorption_coefficient,
-        total_surface as surface_area,
-        floor_height_m,
-        n._of_sound_sources_int,
-        average_sound_source_distance_m,
-        barrier_distance_m,
-        barrier_height_m
-    FROM comfort_lookup
-    WHERE {' AND '.join(conditions)}
-    ORDER BY comfort_index DESC
-    LIMIT 1;
-    """
-    print("📝 SQL Query:", sql_query)
-    print("📝 SQL Parameters:", params)
+        return None
+    shape = tuple(col for col, _ in conditions)
+    sql = pool.statement(("best_row", shape), lambda: (
+        "SELECT " + ", ".join(f'"{col}"' for col in _select_columns(pool))
+        + f' FROM {TABLE} WHERE ' + " AND ".join(f'"{col}" = ?' for col in shape)
+        + f' ORDER BY "{COMFORT_COLUMN}" DESC LIMIT 1'
+    ))
+    print("📝 SQL Query:", sql)
+    print("📝 SQL Parameters:", [value for _, value in conditions])
+    return pool.fetch_dict(sql, [value for _, value in conditions])
+
+def features_from_row(user_input, row):
+    """
+    Full model feature dict from a comfort_lookup row (missing model inputs -> 0).
+    """
+    features = {col: 0.0 for col in numeric_features}
+    features.update({col: row[col] for col in numeric_features if row.get(col) is not None})
+    features.update({
+        'zone_string': user_input.get('zone_string'),
+        'apartment_type_string': user_input.get('apartment_type_string'),
+        'day/nightstring': row.get(DAY_NIGHT_COLUMN) or resolve_day_night(user_input.get('time_period', 'day')),
+        'element_materials_string': row.get('element_materials_string') or user_input.get('element_materials_string', 'Unknown'),
+    })
+    return features
+
+def user_material_changes(user_input):
+    """
+    Wall / window materials the user asked for, as material changes for a matched row
+    (the row's own materials count as unknown, i.e. the element's average absorption).
+    """
+    return {element: user_input[f"{element}_material"] for element in ("wall", "window")
+            if user_input.get(f"{element}_material")}
+
+def sql_results(hits):
+    """
+    Pipeline output dicts for database hits, in order.
+    hits: list of (user_input, row, source). The row's measured features are adjusted
+    for the user's materials, scored in one model call and checked with the same
+    compliance rules and recommendations as recommend_recompute.
+    Raises ValueError when an input lacks zone or apartment type.
+    """
+    params_list, feature_rows = [], []
+    for user_input, row, _ in hits:
+        _, params = parse_user_input(user_input)
+        features = features_from_row(user_input, row)
+        changes = user_material_changes(user_input)
+        if changes:
+            features = apply_material_changes(features, {}, changes)
+        params_list.append(params)
+        feature_rows.append(features)
+    scores = [round(float(score), 3) for score in predict_scores(feature_rows)]
+
+    # === Wall upgrade re-runs, batched into one more call ===
+    upgrades = [find_wall_upgrade(params["wall_material"], features) for params, features in zip(params_list, feature_rows)]
+    upgrade_rows = [j for j, (_, best_wall) in enumerate(upgrades) if best_wall]
+    improved = {}
+    if upgrade_rows:
+        try:
+            improved_scores = predict_scores([
+                apply_material_changes(feature_rows[j], {'wall': upgrades[j][0]}, {'wall': upgrades[j][1][1]})
+                for j in upgrade_rows
+            ])
+            improved = {j: round(float(score), 3) for j, score in zip(upgrade_rows, improved_scores)}
+        except Exception as e:
+            print(f"❌ Error in improved score prediction: {str(e)}")
+
+    # === Compliance for every hit in one vectorized pass ===
+    evaluation = rules.evaluate(
+        [params["zone"] for params in params_list],
+        [params["period"] for params in params_list],
+        [params["activity"] for params in params_list],
+        [features.get("laeq_db") for features in feature_rows],
+        [features.get("rt60_s") for features in feature_rows],
+        scores,
+    )
+    guidance = load_guidance()
+    results = []
+    for j, ((_, _, source), params, features) in enumerate(zip(hits, params_list, feature_rows)):
+        current_wall, best_wall = upgrades[j]
+        result = build_result(params, features, source, scores[j], current_wall, best_wall, improved.get(j),
+                              guidance, evaluation=evaluation.row(j))
+        result["source"] = source
+        results.append(result)
+    return results
+
+# === Full-text material search ===
+# Element-type names and filler words appear in nearly every element string, so they
+# would let any text match some row; only material words are searched for
+FTS_IGNORED_TERMS = {
+    "wall", "walls", "window", "windows", "floor", "floors", "door", "doors", "ceiling", "ceilings",
+    "and", "or", "not", "with", "on", "of", "the", "a", "an", "in", "for", "to",
+}
+
+def fts_query(text, any_term=False):
+    """
+    FTS5 MATCH expression for free-form material text: every material word quoted (so
+    words like "and"/"or" are terms, not operators), combined with AND, or OR when
+    any_term is set. Empty when the text names no material words.
+    """
+    terms = [term for term in dict.fromkeys(re.findall(r"[a-z0-9]+", str(text).lower()))
+             if term not in FTS_IGNORED_TERMS]
+    return (" OR " if any_term else " ").join(f'"{term}"' for term in terms)
+
+@timed("sql_search")
+def search_best_row(user_input, text=None):
+    """
+    Best comfort_lookup row whose element materials match the text (ranked by bm25,
+    then comfort), within the input's apartment type / zone / period when given.
+    Tries all terms first, then any term. Returns a dict or None.
+    """
+    pool = get_pool(DB_PATH)
+    if not pool.has_table(FTS_TABLE):
+        return None
+    text = text or user_input.get("material_query") or user_input.get("element_materials_string")
+    if not text:
+        return None
+    conditions = [(col, value) for col, value in _lookup_conditions(user_input, pool)
+                  if col != "element_materials_string_clean"]
+    shape = tuple(col for col, _ in conditions)
+    sql = pool.statement(("search_best_row", shape), lambda: (
+        "SELECT " + ", ".join(f'c."{col}"' for col in _select_columns(pool))
+        + f", bm25({FTS_TABLE}) AS match_rank FROM {FTS_TABLE} JOIN {TABLE} c ON c.row_id = {FTS_TABLE}.rowid"
+        + f" WHERE {FTS_TABLE} MATCH ?" + "".join(f' AND c."{col}" = ?' for col in shape)
+        + ' ORDER BY match_rank, c."' + COMFORT_COLUMN + '" DESC LIMIT 1'
+    ))
+    tried = set()
+    for any_term in (False, True):
+        query = fts_query(text, any_term)
+        if not query:
+            return None
+        if query in tried:  # single material word: the OR pass is the same query
+            continue
+        tried.add(query)
+        print(f"🔎 Material search: {query}")
+        row = pool.fetch_dict(sql, [query] + [value for _, value in conditions])
+        if row is not None:
+            return row
+    return None
+
+def search_materials(text, limit=10):
+    """
+    Distinct element material strings ranked against free-form text.
+    """
+    pool = get_pool(DB_PATH)
+    if not pool.has_table(FTS_TABLE) or not fts_query(text):
+        return []
+    sql = pool.statement("search_materials", lambda: (
+        "SELECT element_materials_string, MIN(match_rank) AS match_rank, COUNT(*) AS rows FROM ("
+        f"SELECT element_materials_string, rank AS match_rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?"
+        ") GROUP BY element_materials_string ORDER BY match_rank LIMIT ?"
+    ))
+    return pool.fetch_dicts(sql, [fts_query(text, any_term=True), limit])
+
+def rows_with_material(material, element_type=None, limit=50):
+    """
+    comfort_lookup rows containing a material (e.g. "Fiberglass Board", element_type="wall"),
+    best comfort first. Resolved through the materials / comfort_lookup_materials tables.
+    """
+    pool = get_pool(DB_PATH)
+    params = [clean_key(material)]
+    if element_type:
+        params.append(str(element_type).lower())
+    sql = pool.statement(("rows_with_material", bool(element_type)), lambda: (
+        "SELECT c.row_id, c.apartment_type_string, c.zone_string, c.\"day/nightstring\", "
+        "c.comfort_index_float, c.laeq_db, c.rt60_s, m.element_type, m.name AS material "
+        "FROM materials m "
+        "JOIN comfort_lookup_materials cm ON cm.material_id = m.material_id "
+        "JOIN comfort_lookup c ON c.row_id = cm.row_id "
+        "WHERE m.name_clean = ?" + (" AND m.element_type = ?" if element_type else "")
+        + " ORDER BY c.comfort_index_float DESC LIMIT ?"
+    ))
+    return pool.fetch_dicts(sql, params + [limit])
 
+def _query_or_recommend(user_input):
     try:
-        result = pd.read_sql_query(sql_query, conn, params=params)
-        print("📦 SQL Result DataFrame:")
-        print(result)
-        if not result.empty:
-            print("✅ Match found in SQL database.")
-            # Build features from SQL result
-            row = result.iloc[0]
-            features = {
-                'zone_string': user_input.get('zone_string'),
-                'apartment_type_string': user_input.get('apartment_type_string'),
-                'element_materials_string': row.get('element_materials_string', user_input.get('element_materials_string', 'Unknown')),
-                'floor_height_m': row.get('floor_height_m', user_input.get('floor_height_m', 3.0)),
-                'laeq_db': row.get('laeq_db', 0.0),
-                'total_surface_sqm': row.get('surface_area', 0.0),
-                'absorption_coefficient_by_area_m': row.get('absorption_coefficient', 0.0),
-                'rt60_s': row.get('rt60_s', 0.0),
-                'n._of_sound_sources_int': row.get('n._of_sound_sources_int', 0),
-                'average_sound_source_distance_m': row.get('average_sound_source_distance_m', 0.0),
-                'spl_db': row.get('spl_db', 0.0),
-                'barrier_distance_m': row.get('barrier_distance_m', 0.0),
-                'barrier_height_m': row.get('barrier_height_m', 0.0)
-            }
-            # Use ML model to predict comfort score
-            from scripts.recommend_recompute import model
-            import pandas as pd
-            categorical = [
-                'zone_string',
-                'apartment_type_string',
-                'element_materials_string'
-            ]
-            numeric = [
-                'floor_height_m',
-                'laeq_db',
-                'total_surface_sqm',
-                'absorption_coefficient_by_area_m',
-                'rt60_s',
-                'n._of_sound_sources_int',
-                'average_sound_source_distance_m',
-                'spl_db',
-                'barrier_distance_m',
-                'barrier_height_m'
-            ]
-            df_features = pd.DataFrame([features])[categorical + numeric]
-            for col in categorical:
-                df_features[col] = df_features[col].astype(str)
-            for col in numeric:
-                df_features[col] = pd.to_numeric(df_features[col], errors='coerce').fillna(0)
-            comfort_score = round(float(model.predict(df_features)[0]), 3)
-            print(f"✅ ML Predicted comfort score: {comfort_score}")
-            # Build metrics for output
-            metrics = {
-                "LAeq (dB)": float(row.get('laeq_db', 0.0)),
-                "RT60 (s)": float(row.get('rt60_s', 0.0)),
-                "SPL (dB)": float(row.get('spl_db', 0.0)),
-                "Absorption Coefficient": float(row.get('absorption_coefficient', 0.0)),
-                "Surface Area (m²)": float(row.get('surface_area', 0.0))
-            }
-            activity = user_input.get('activity', 'Living')
-            compliance_info = {
-                "status": "compliant",
-                "reason": "Matched from database",
-                "metrics": metrics,
-                "thresholds": {
-                    "LAeq (dB)": 35 if activity == "Sleeping" else 40,
-                    "RT60 (s)": 0.5 if activity == "Sleeping" else 0.6
-                }
-            }
-            return {
-                "comfort_score": comfort_score,
-                "source": "SQL+ML",
-                "compliance": compliance_info,
-                "recommendations": {},
-                "improved_score": None
-            }
-        else:
+        source = "SQL+ML"
+        # Ranked material search mode: explicit material_query, or no exact element match
+        row = None if "material_query" in user_input else lookup_best_row(user_input)
+        if row is None and ("material_query" in user_input or "element_materials_string" in user_input):
+            row = search_best_row(user_input)
+            source = "SQL(FTS)+ML"
+        if row is None:
             print("⚠️ No match found in SQL database")
             print("🔄 Switching to model + compliance + recommendation...")
-            return recommend_recompute(user_input)
+            return recommend_from_cube_or_model(user_input)
+        print("✅ Match found in SQL database.")
+        print("📦 SQL Result:", row)
+        # Use ML model to predict comfort score (compiled scorer, no DataFrame round-trip)
+        result = sql_results([(user_input, row, source)])[0]
+        print(f"✅ ML Predicted comfort score: {result['comfort_score']}")
+        metrics.inc("answers_total", path="sql_fts" if source == "SQL(FTS)+ML" else "sql")
+        return result
     except Exception as e:
         print("⚠️ SQL lookup failed:", str(e))
         print("🔄 Switching to model + compliance + recommendation...")
-        return recommend_recompute(user_input)
-    finally:
-        conn.close()
+        return recommend_from_cube_or_model(user_input)
+
+# === Bulk lookups ===
+BULK_KEY_COLUMNS = ["apartment_type_string_clean", "zone_string_clean", DAY_NIGHT_COLUMN, "element_materials_string_clean"]
+
+def _bulk_key(user_input, pool):
+    """
+    (apartment, zone, period, element) with None for "any", or None if SQL has nothing to match.
+    """
+    if "material_query" in user_input:
+        return None
+    conditions = dict(_lookup_conditions(user_input, pool))
+    if not conditions:
+        return None
+    return tuple(conditions.get(col) for col in BULK_KEY_COLUMNS)
+
+@timed("sql_bulk_lookup")
+def lookup_best_rows(keys):
+    """
+    Best comfort_lookup row for every key, via indexed joins against a TEMP table of keys
+    (one query per key shape, i.e. per set of given columns - usually just one).
+    keys: list of (apartment, zone, period, element) tuples (None = any).
+    Returns a list of dicts (or None) aligned with keys.
+    """
+    pool = get_pool(DB_PATH)
+    shapes = {}
+    for i, key in enumerate(keys):
+        shape = tuple(col for col, value in zip(BULK_KEY_COLUMNS, key) if value is not None)
+        shapes.setdefault(shape, []).append(i)
+    conn = pool.load_temp_table(
+        "lookup_keys", ["idx INTEGER PRIMARY KEY", "shape TEXT", "k0 TEXT", "k1 TEXT", "k2 TEXT", "k3 TEXT"],
+        [(i, "|".join(shape), *keys[i]) for shape, indices in shapes.items() for i in indices]
+    )
+
+    rows = [None] * len(keys)
+    for shape in shapes:
+        sql = pool.statement(("lookup_best_rows", shape), lambda: (
+            "SELECT k.idx, " + ", ".join(f'c."{col}"' for col in _select_columns(pool))
+            + f" FROM temp.lookup_keys k JOIN {TABLE} c ON c.row_id = ("
+            + f"SELECT b.row_id FROM {TABLE} b WHERE "
+            + " AND ".join(f'b."{col}" = k.k{BULK_KEY_COLUMNS.index(col)}' for col in shape)
+            + f' ORDER BY b."{COMFORT_COLUMN}" DESC LIMIT 1) WHERE k.shape = ?'
+        ))
+        cursor = conn.execute(sql, ("|".join(shape),))
+        names = [d[0] for d in cursor.description][1:]
+        for idx, *values in cursor.fetchall():
+            rows[idx] = dict(zip(names, values))
+    return rows
+
+def query_many(user_inputs):
+    """
+    Bulk query_or_recommend for building-wide analysis: one result per input, in order.
+    Cached inputs are served from cache, the rest are resolved with one SQL join;
+    SQL misses go through material search and the prediction cube, and whatever is
+    left is scored in a single recommend_recompute_batch call.
+    """
+    pool = get_pool(DB_PATH)
+    db = file_fingerprint(DB_PATH)
+    inputs = [standardize_input(user_input) for user_input in user_inputs]
+    results = [None] * len(inputs)
+    cache_keys = {}
+    pending = []
+    for i, user_input in enumerate(inputs):
+        cache_keys[i] = prediction_cache.key("query_or_recommend", {"input": user_input, "db": db})
+        cached = prediction_cache.get(cache_keys[i])
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.append(i)
+
+    # === One join for every key SQL can match ===
+    keyed = []
+    try:
+        keyed = [(i, key) for i in pending for key in [_bulk_key(inputs[i], pool)] if key is not None]
+        rows = lookup_best_rows([key for _, key in keyed]) if keyed else []
+    except Exception as e:
+        print("⚠️ Bulk SQL lookup failed:", str(e))
+        rows = [None] * len(keyed)
+    hits = {i: (row, "SQL+ML") for (i, _), row in zip(keyed, rows) if row is not None}
+
+    # === Ranked material search for element / material_query misses ===
+    for i in pending:
+        if i not in hits and ("material_query" in inputs[i] or "element_materials_string" in inputs[i]):
+            try:
+                row = search_best_row(inputs[i])
+            except Exception as e:
+                print("⚠️ Material search failed:", str(e))
+                row = None
+            if row is not None:
+                hits[i] = (row, "SQL(FTS)+ML")
+    print(f"✅ Bulk SQL: {len(hits)} of {len(pending)} uncached inputs matched")
+
+    # === Score and check all SQL hits in one pass (inputs that cannot be parsed fall through) ===
+    order = []
+    for i in hits:
+        try:
+            parse_user_input(inputs[i])
+            order.append(i)
+        except ValueError:
+            pass
+    if order:
+        for i, result in zip(order, sql_results([(inputs[i], *hits[i]) for i in order])):
+            results[i] = result
+
+    # === Misses: prediction cube, then one batched ML call ===
+    misses = []
+    cube = get_prediction_cube()
+    for i in pending:
+        if results[i] is None:
+            results[i] = cube.lookup(inputs[i])
+            if results[i] is None:
+                misses.append(i)
+    if misses:
+        for i, result in zip(misses, recommend_recompute_batch([inputs[i] for i in misses])):
+            results[i] = result
+
+    for i in pending:
+        if "error" not in results[i]:
+            prediction_cache.set(cache_keys[i], results[i])
+    return results
@@ -1,4 +1,7 @@
-from server.config import client, completion_model
+from server.config import llm_backend
+from utils.llm_cache import cached_completion
+
+guidance_llm = llm_backend("guidance")
 
 def handle_llm_query(user_question: str) -> str:
     system_prompt = """
@@ -10,11 +13,7 @@ You are an expert in architectural acoustics. Provide clear, concise answers to
 - WHO/ISO compliance for various room types
 Use layman-friendly language when needed.
 """
-    response = client.chat.completions.create(
-        model=completion_model,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_question}
-        ]
-    )
-    return response.choices[0].message.content.strip()
\ No newline at end of file
+    return cached_completion(guidance_llm.client, guidance_llm.completion_model, [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_question}
+    ]).strip()
\ No newline at end of file
@@ -2945,15 +2945,14 @@ Please provide a detailed, model-specific answer that references the actual load
             print(f"\n[DEBUG] Simplified Prompt (IFC-only):")
             print(f"[DEBUG] {prompt}")
             
-            from server.config import client, completion_model
-            response = client.chat.completions.create(
-                model=completion_model,
-                messages=[
-                    {"role": "system", "content": "You are an architectural acoustics advisor analyzing a SPECIFIC IFC building model that is currently loaded. You MUST ALWAYS reference the actual loaded geometry, spaces, apartment types, and properties from the model data provided. NEVER give generic acoustic advice - always start with what you can see in the loaded model. If the model data shows specific materials, properties, or spaces, reference them directly. When providing acoustic recommendations, ALWAYS include: 1) Specific material upgrades with absorption coefficients, 2) Construction improvements, 3) Room geometry modifications, 4) HVAC adjustments, 5) Acoustic treatment suggestions, 6) Cost estimates, 7) Priority ranking, and 8) Expected performance improvements. Explain WHY each recommendation will help and provide both immediate fixes and long-term solutions."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            answer = response.choices[0].message.content.strip()
+            from server.config import llm_backend
+            from utils.llm_cache import cached_completion
+            chatbot_llm = llm_backend("chatbot")
+            # Same model data + question replays from the on-disk LLM cache
+            answer = cached_completion(chatbot_llm.client, chatbot_llm.completion_model, [
+                {"role": "system", "content": "You are an architectural acoustics advisor analyzing a SPECIFIC IFC building model that is currently loaded. You MUST ALWAYS reference the actual loaded geometry, spaces, apartment types, and properties from the model data provided. NEVER give generic acoustic advice - always start with what you can see in the loaded model. If the model data shows specific materials, properties, or spaces, reference them directly. When providing acoustic recommendations, ALWAYS include: 1) Specific material upgrades with absorption coefficients, 2) Construction improvements, 3) Room geometry modifications, 4) HVAC adjustments, 5) Acoustic treatment suggestions, 6) Cost estimates, 7) Priority ranking, and 8) Expected performance improvements. Explain WHY each recommendation will help and provide both immediate fixes and long-term solutions."},
+                {"role": "user", "content": prompt}
+            ]).strip()
             
             # Debug print the final AI response
             print(f"\n[DEBUG] Final AI Response:")
@@ -4302,19 +4301,10 @@ Note: Some IFC elements (like IfcSpace) may not have geometric representation an
         failures = []
         
         try:
-            # Import compliance thresholds and ML inference
-            from utils.reference_data import DAY_RANGES, NIGHT_RANGES, RT60_target, RT60_max_dev
+            # Compiled compliance rules (thresholds + guidance are loaded once per process)
+            from utils.compliance_rules import get_rules, SPACE_RT60_HIGH, SPACE_RT60_LOW, SPACE_SPL_HIGH
             from utils.infer_from_inputs import infer_features
-            import json
-            
-            # Load enhanced compliance guidance as primary source
-            try:
-                with open('knowledge/compliance_guidance.json', 'r') as f:
-                    compliance_guidance = json.load(f)
-                print("[DEBUG] Successfully loaded compliance guidance JSON")
-            except Exception as e:
-                print(f"[DEBUG] Failed to load compliance guidance JSON: {e}")
-                compliance_guidance = {}
+            rules = get_rules()
             
             # Get space properties
             volume = space_info.get('volume', 0)
@@ -4434,24 +4424,26 @@ Note: Some IFC elements (like IfcSpace) may not have geometric representation an
             if not acoustic_props:
                 failures.append("No acoustic properties defined - cannot assess performance")
             else:
+                # Screen every RT60/SPL property in one pass (UI10 lenient thresholds)
+                rt60_vals, spl_vals = [], []
                 for prop_name, value in acoustic_props.items():
-                    if 'rt60' in prop_name.lower() and value:
-                        try:
-                            rt60_val = float(value)
-                            if rt60_val > 3.0:  # UI10: 3.0 vs UI12: 2.5
-                                failures.append(f"Excessive RT60 ({rt60_val}s) - poor acoustic performance")
-                            elif rt60_val < 0.2:  # UI10: 0.2 vs UI12: 0.1
-                                failures.append(f"Very low RT60 ({rt60_val}s) - space may be too dead")
-                        except:
-                            pass
-                    
-                    if 'spl' in prop_name.lower() and value:
-                        try:
-                            spl_val = float(value)
-                            if spl_val > 70:  # UI10: 70 vs UI12: various lower thresholds
-                                failures.append(f"High SPL ({spl_val} dBA) - excessive noise levels")
-                        except:
-                            pass
+                    try:
+                        if 'rt60' in prop_name.lower() and value:
+                            rt60_vals.append(float(value))
+                        if 'spl' in prop_name.lower() and value:
+                            spl_vals.append(float(value))
+                    except (TypeError, ValueError):
+                        pass
+                rt60_checks = rules.screen_spaces(rt60_vals, [None] * len(rt60_vals))
+                for rt60_val, high, low in zip(rt60_vals, rt60_checks[SPACE_RT60_HIGH], rt60_checks[SPACE_RT60_LOW]):
+                    if high:
+                        failures.append(f"Excessive RT60 ({rt60_val}s) - poor acoustic performance")
+                    elif low:
+                        failures.append(f"Very low RT60 ({rt60_val}s) - space may be too dead")
+                spl_checks = rules.screen_spaces([None] * len(spl_vals), spl_vals)
+                for spl_val, high in zip(spl_vals, spl_checks[SPACE_SPL_HIGH]):
+                    if high:
+                        failures.append(f"High SPL ({spl_val} dBA) - excessive noise levels")
             
             # === SUMMARY ===
             if not failures:
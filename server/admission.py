@@ -0,0 +1,166 @@
+# server/admission.py
+
+"""
+Admission control for the API server.
+
+Requests hold one of a bounded number of active slots. When all slots are taken,
+they wait in a priority queue (interactive /predict ahead of /query ahead of batch
+jobs). Each class has its own queue bound and may cap its share of the slots, so a
+flood of batch jobs cannot starve interactive users. Clients are limited to a number
+of concurrent (active + queued) requests. Overload is answered fast: 429 when a client
+exceeds its limit, 503 when a queue is full or the wait times out.
+
+Runs on the event loop only (no locks needed).
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import Counter
+
+from utils.metrics import metrics
+
+INTERACTIVE = 0
+QUERY = 1
+BATCH = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", QUERY: "query", BATCH: "batch"}
+
+
+class Rejected(Exception):
+    def __init__(self, status_code, detail, retry_after=1):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class Ticket:
+    __slots__ = ("priority", "client", "enqueued", "released")
+
+    def __init__(self, priority, client):
+        self.priority = priority
+        self.client = client
+        self.enqueued = time.perf_counter()
+        self.released = False
+
+
+class AdmissionController:
+    def __init__(self, max_active, class_limits, queue_limits, per_client_limit, queue_timeout):
+        self.max_active = max_active
+        self.class_limits = class_limits
+        self.queue_limits = queue_limits
+        self.per_client_limit = per_client_limit
+        self.queue_timeout = queue_timeout
+        self.active = Counter()
+        self.queued = Counter()
+        self.clients = Counter()
+        self.rejected = 0
+        self.waiters = []  # heap of (priority, seq, future, ticket)
+        self.seq = itertools.count()
+
+    def _can_start(self, priority):
+        return sum(self.active.values()) < self.max_active and self._class_open(priority)
+
+    def _class_open(self, priority):
+        return self.active[priority] < self.class_limits.get(priority, self.max_active)
+
+    def _waiting_ahead(self, priority):
+        # Waiters held back by their own class cap do not hold up other classes
+        return any(p <= priority and not future.done() and self._class_open(p) for p, _, future, _ in self.waiters)
+
+    def _start(self, ticket):
+        self.active[ticket.priority] += 1
+        metrics.observe("admission_wait_seconds", time.perf_counter() - ticket.enqueued,
+                        priority=PRIORITY_NAMES[ticket.priority])
+
+    def _reject(self, ticket, status_code, reason, detail):
+        self._drop_client(ticket.client)
+        self.rejected += 1
+        metrics.inc("admission_rejected_total", priority=PRIORITY_NAMES[ticket.priority], reason=reason)
+        raise Rejected(status_code, detail)
+
+    def _wake(self):
+        # Start waiters in priority order for as long as slots allow; a waiter held back
+        # by its class cap is skipped (and kept) so lower classes can use the free slots
+        held = []
+        while self.waiters and sum(self.active.values()) < self.max_active:
+            entry = heapq.heappop(self.waiters)
+            priority, _, future, ticket = entry
+            if future.done():
+                continue
+            if not self._class_open(priority):
+                held.append(entry)
+                continue
+            self.queued[priority] -= 1
+            self._start(ticket)
+            future.set_result(True)
+        for entry in held:
+            heapq.heappush(self.waiters, entry)
+
+    async def acquire(self, priority, client):
+        """
+        Returns a Ticket once the request may run; raises Rejected (429 / 503) otherwise.
+        """
+        ticket = Ticket(priority, client)
+        self.clients[client] += 1
+        if self.clients[client] > self.per_client_limit:
+            self._reject(ticket, 429, "client_limit", "Too many concurrent requests for this client")
+
+        # Fast path: free slot and nobody of equal or higher priority waiting
+        if self._can_start(priority) and not self._waiting_ahead(priority):
+            self._start(ticket)
+            return ticket
+
+        if self.queued[priority] >= self.queue_limits.get(priority, 0):
+            self._reject(ticket, 503, "queue_full", f"Server busy ({PRIORITY_NAMES[priority]} queue full)")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.seq), future, ticket))
+        self.queued[priority] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()
+                self.queued[priority] -= 1
+                self._reject(ticket, 503, "queue_timeout", "Server busy (timed out waiting for a slot)")
+        except asyncio.CancelledError:
+            # Client went away while queued (or right after being started)
+            if future.done() and not future.cancelled():
+                self.release(ticket)
+            else:
+                future.cancel()
+                self.queued[priority] -= 1
+                self._drop_client(client)
+            raise
+        return ticket
+
+    def release(self, ticket):
+        """
+        Frees the ticket's slot (idempotent) and starts the next waiters.
+        """
+        if ticket is None or ticket.released:
+            return
+        ticket.released = True
+        self.active[ticket.priority] -= 1
+        self._drop_client(ticket.client)
+        self._wake()
+
+    def _drop_client(self, client):
+        self.clients[client] -= 1
+        if self.clients[client] <= 0:
+            del self.clients[client]
+
+    def stats(self):
+        stats = {
+            "active": sum(self.active.values()),
+            "queued": sum(self.queued.values()),
+            "max_active": self.max_active,
+            "clients": len(self.clients),
+            "rejected": self.rejected,
+        }
+        for priority, name in PRIORITY_NAMES.items():
+            stats[f"active_{name}"] = self.active[priority]
+            stats[f"queued_{name}"] = self.queued[priority]
+        return stats
@@ -2,48 +2,344 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from fastapi import FastAPI, Request
-from scripts.sql_calls import query_or_recommend
-from scripts.llm_calls import extract_variables, build_answer
-from scripts.recommend_recompute import run_acoustic_prediction
-app = FastAPI()
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from scripts.core.llm_calls import extract_variables_async, build_answer_async, build_answer_stream_async, is_structured
+from utils.format_interpreter import standardize_input
+from utils.single_flight import AsyncSingleFlight, flight_key
+from utils.metrics import metrics
+from server.config import (
+    BATCH_CHUNK_SIZE, BATCH_PARALLEL_CHUNKS, PRELOAD_ON_STARTUP, PRELOAD_RETRY_S,
+    MAX_ACTIVE_REQUESTS, BATCH_MAX_ACTIVE, QUERY_MAX_ACTIVE,
+    INTERACTIVE_QUEUE_LIMIT, QUERY_QUEUE_LIMIT, BATCH_QUEUE_LIMIT, PER_CLIENT_LIMIT, QUEUE_TIMEOUT_S,
+    client_registry
+)
+from server.admission import AdmissionController, Rejected, INTERACTIVE, QUERY, BATCH
+from server.worker_pool import POOL_SIZES, get_executor, run_cpu, run_batch, shutdown
+from server import warmup
+
+# Handlers stay non-blocking: scoring runs in the worker pool, LLM calls use the async client.
+# The pipeline modules (model, dataset, cube, ...) are loaded by server/warmup.py, never on the event loop.
+
+# One preload in flight at a time; after a failure it is retried at most every PRELOAD_RETRY_S
+_preload = {"task": None, "failed_at": None}
+
+async def run_preload():
+    ready = await asyncio.to_thread(warmup.preload)
+    _preload["failed_at"] = None if ready else time.monotonic()
+    return ready
+
+def start_preload():
+    task = _preload["task"]
+    if task is None or task.done():
+        task = _preload["task"] = asyncio.create_task(run_preload())
+    return task
+
+async def warm_up():
+    if await start_preload():
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(get_executor(pool), warmup.warm_worker)
+                               for pool, size in POOL_SIZES.items() for _ in range(size)])
+        print("✅ API server warm and ready")
+
+@asynccontextmanager
+async def lifespan(app):
+    # Live immediately (/healthz); ready (/readyz) once the preload has finished
+    app.state.warmup = asyncio.create_task(warm_up()) if PRELOAD_ON_STARTUP else None
+    yield
+    if app.state.warmup is not None:
+        app.state.warmup.cancel()
+    shutdown(wait=False)
+    await client_registry.aclose()
+
+async def pipeline():
+    """
+    Pipeline entry points; waits for (or, without preload, triggers) the warmup.
+    Raises 503 while a required warmup step is failing.
+    """
+    if warmup.is_ready():
+        return warmup.services
+    task = _preload["task"]
+    if task is None or task.done():
+        failed_at = _preload["failed_at"]
+        if failed_at is not None and time.monotonic() - failed_at < PRELOAD_RETRY_S:
+            retry_after = int(PRELOAD_RETRY_S - (time.monotonic() - failed_at)) + 1
+            raise HTTPException(status_code=503, detail="Pipeline unavailable (warmup failed, see /readyz)",
+                                headers={"Retry-After": str(retry_after)})
+        task = start_preload()
+    # Shielded: a client going away must not cancel the preload other requests wait on
+    if not await asyncio.shield(task):
+        raise HTTPException(status_code=503, detail="Pipeline unavailable (warmup failed, see /readyz)",
+                            headers={"Retry-After": str(int(PRELOAD_RETRY_S))})
+    return warmup.services
+
+app = FastAPI(lifespan=lifespan)
+
+# Identical concurrent requests await one computation (and one LLM call) instead of each running their own
+api_flight = AsyncSingleFlight("api")
+metrics.register_collector("api_flight", api_flight.stats)
+
+# Bounded, prioritized admission: /predict and /optimize ahead of /query ahead of batch jobs
+admission = AdmissionController(
+    max_active=MAX_ACTIVE_REQUESTS,
+    class_limits={QUERY: QUERY_MAX_ACTIVE, BATCH: BATCH_MAX_ACTIVE},
+    queue_limits={INTERACTIVE: INTERACTIVE_QUEUE_LIMIT, QUERY: QUERY_QUEUE_LIMIT, BATCH: BATCH_QUEUE_LIMIT},
+    per_client_limit=PER_CLIENT_LIMIT,
+    queue_timeout=QUEUE_TIMEOUT_S,
+)
+metrics.register_collector("admission", admission.stats)
+metrics.register_collector("llm_clients", client_registry.stats)
+
+@app.exception_handler(Rejected)
+async def rejected_handler(request: Request, exc: Rejected):
+    return JSONResponse({"detail": exc.detail}, status_code=exc.status_code, headers={"Retry-After": str(exc.retry_after)})
+
+def client_id(request: Request) -> str:
+    return request.headers.get("x-client-id") or (request.client.host if request.client else "unknown")
+
+@asynccontextmanager
+async def admitted(request: Request, priority: int):
+    ticket = await admission.acquire(priority, client_id(request))
+    try:
+        yield
+    finally:
+        admission.release(ticket)
+
+def streaming_response(ticket, body, **kwargs):
+    """
+    StreamingResponse that keeps its admission slot until the stream ends.
+    """
+    async def held():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            admission.release(ticket)
+    # The background task covers streams that never start (release is idempotent)
+    return StreamingResponse(held(), background=BackgroundTask(admission.release, ticket), **kwargs)
+
+def _route_label(request):
+    # Matched route template rather than the raw path, so scanners and typos cannot
+    # grow the label set; anything unmatched is "other"
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "other"
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        metrics.inc("http_errors_total", path=_route_label(request))
+        raise
+    path = _route_label(request)
+    # Streaming endpoints are timed until their headers are sent
+    metrics.observe("http_request_duration_seconds", time.perf_counter() - start, path=path)
+    metrics.inc("http_requests_total", path=path, status=response.status_code)
+    return response
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    status = warmup.readiness()
+    if not PRELOAD_ON_STARTUP and not status["ready"]:
+        # Lazy mode: the first request loads everything, so route traffic anyway
+        return {**status, "lazy": True}
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics.json")
+async def metrics_json():
+    return metrics.snapshot()
 
 @app.post("/predict")
 async def predict(request: Request):
     user_input = await request.json()
-    # Optionally clean up keys/values for casing here
-    result = query_or_recommend(user_input)
+    async with admitted(request, INTERACTIVE):
+        services = await pipeline()
+        # Optionally clean up keys/values for casing here
+        result = await api_flight.do(
+            flight_key("predict", user_input), lambda: run_cpu(services.query_or_recommend, user_input)
+        )
     return {"result": result}
 
-import sys
-import os
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+def parse_batch_body(body: bytes, content_type: str = "") -> list:
+    """
+    A JSON array, {"inputs": [...]} or NDJSON (one user_input object per line).
+    """
+    text = body.decode("utf-8").strip()
+    if not text:
+        return []
+    if "ndjson" not in content_type and text[0] in "[{":
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            data = None  # several objects on separate lines: fall through to NDJSON
+        if isinstance(data, dict) and isinstance(data.get("inputs"), list):
+            return data["inputs"]
+        if isinstance(data, list):
+            return data
+        if isinstance(data, dict):
+            return [data]
+    inputs = []
+    for n, line in enumerate(text.splitlines(), 1):
+        if line.strip():
+            try:
+                inputs.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                raise ValueError(f"line {n}: {e}")
+    return inputs
 
-from fastapi import FastAPI, Request
-from scripts.sql_calls import query_or_recommend
-from scripts.llm_calls import extract_variables, build_answer
+@app.post("/predict/batch")
+async def predict_batch(request: Request):
+    try:
+        inputs = parse_batch_body(await request.body(), request.headers.get("content-type", ""))
+    except (UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch body: {e}")
+    if not all(isinstance(user_input, dict) for user_input in inputs):
+        raise HTTPException(status_code=400, detail="Every batch item must be a user_input object")
+    ticket = await admission.acquire(BATCH, client_id(request))
+    try:
+        services = await pipeline()
+    except BaseException:
+        admission.release(ticket)
+        raise
 
-app = FastAPI()
+    chunk_slots = asyncio.Semaphore(BATCH_PARALLEL_CHUNKS)
 
-@app.post("/predict")
-async def predict(request: Request):
-    user_input = await request.json()
-    # Optionally clean up keys/values for casing here
-    result = query_or_recommend(user_input)
+    async def score_chunk(start):
+        chunk = inputs[start:start + BATCH_CHUNK_SIZE]
+        try:
+            async with chunk_slots:
+                return start, await run_batch(services.query_many, chunk)
+        except Exception as e:
+            print(f"❌ Batch chunk failed: {e}")
+            return start, [{"error": str(e)}] * len(chunk)
+
+    async def stream():
+        # Chunks run in parallel in the batch pool (BATCH_PARALLEL_CHUNKS at a time); each line carries its input index
+        tasks = [asyncio.ensure_future(score_chunk(start)) for start in range(0, len(inputs), BATCH_CHUNK_SIZE)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                start, results = await task
+                yield "".join(
+                    json.dumps({"index": start + j, "result": result}, default=str) + "\n"
+                    for j, result in enumerate(results)
+                )
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return streaming_response(ticket, stream(), media_type="application/x-ndjson")
+
+@app.post("/optimize")
+async def optimize(request: Request):
+    data = await request.json()
+    # Full upgrade plan (Pareto front over wall/window/floor/door swaps) in one call
+    user_input = data.get("input") or {k: v for k, v in data.items() if k not in ("elements", "max_changes")}
+    async with admitted(request, INTERACTIVE):
+        services = await pipeline()
+        try:
+            result = await api_flight.do(
+                flight_key("optimize", data),
+                lambda: run_cpu(services.optimize_materials, user_input, elements=data.get("elements"), max_changes=data.get("max_changes"))
+            )
+        except ValueError as e:
+            # e.g. zone / apartment type missing from the body
+            raise HTTPException(status_code=400, detail=str(e))
     return {"result": result}
 
 @app.post("/query")
 async def query(request: Request):
     data = await request.json()
     user_question = data.get("question", "")
+    async with admitted(request, QUERY):
+        answer = await api_flight.do(flight_key("query", user_question), lambda: answer_question(user_question))
+    return {"guidance": answer}
+
+async def answer_question(user_question: str) -> str:
     # Try to extract variables (structured input) from the question
-    user_input = extract_variables(user_question)
-    if user_input:
-        result = query_or_recommend(user_input)
-        answer = build_answer(user_question, result)
-        return {"guidance": answer}
+    user_input = await extract_variables_async(user_question)
+    if is_structured(user_input):
+        services = await pipeline()
+        result = await run_cpu(services.query_or_recommend, user_input)
+        return await build_answer_async(user_question, result)
     else:
         # fallback: just chat LLM for general Q&A
-        from scripts.llm_acoustic_query_handler import handle_llm_query
-        answer = handle_llm_query(user_question)
-        return {"guidance": answer}
+        from scripts.core.llm_acoustic_query_handler import handle_llm_query_async
+        return await handle_llm_query_async(user_question)
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.post("/query/stream")
+async def query_stream(request: Request):
+    """
+    Server-sent events: "result" (structured score, as soon as inference is done),
+    then "token" events with the LLM summary as it is generated, then "done".
+    Body: {"question": ...} and/or {"input": {...}} to skip extraction.
+    A missing zone / apartment type (400) or a failing warmup (503) is answered before
+    the stream starts; failures after that arrive as an "error" event.
+    """
+    data = await request.json()
+    user_question = data.get("question", "")
+    ticket = await admission.acquire(QUERY, client_id(request))
+    try:
+        user_input = data.get("input")
+        if not user_input:
+            extracted = await extract_variables_async(user_question)
+            user_input = extracted if is_structured(extracted) else None
+        services = None
+        if user_input:
+            user_input = standardize_input(user_input)
+            if not user_input.get("zone_string") or not user_input.get("apartment_type_string"):
+                raise HTTPException(status_code=400, detail="Both zone_string and apartment_type_string are required")
+            services = await pipeline()
+    except BaseException:
+        admission.release(ticket)
+        raise
+
+    async def stream():
+        if services is None:
+            # fallback: general Q&A (no zone + apartment type to score), sent as a single token
+            try:
+                from scripts.core.llm_acoustic_query_handler import handle_llm_query_async
+                answer = await handle_llm_query_async(user_question)
+            except Exception as e:
+                yield sse("error", f"[LLM Error] {e}")
+                yield sse("done", {"summary": ""})
+                return
+            yield sse("token", answer)
+            yield sse("done", {"summary": answer})
+            return
+
+        try:
+            result = await api_flight.do(flight_key("result", user_input), lambda: run_cpu(services.compute_result, user_input))
+        except Exception as e:
+            yield sse("error", f"[Pipeline Error] {e}")
+            yield sse("done", {"summary": ""})
+            return
+        yield sse("result", {"input": user_input, "result": result})
+
+        parts = []
+        try:
+            async for token in build_answer_stream_async(user_question or str(user_input), result):
+                parts.append(token)
+                yield sse("token", token)
+        except Exception as e:
+            yield sse("error", f"[LLM Summary Error] {e}")
+        yield sse("done", {"summary": "".join(parts).strip()})
+
+    return streaming_response(ticket, stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
@@ -1,18 +1,50 @@
-import random
-from openai import OpenAI
-from server.keys import *
+import os
+import threading
 import sqlite3
+from types import SimpleNamespace
 
 # Mode
-mode = "openai"  # "local" or "openai" or "cloudflare"
+mode = os.environ.get("AI25_LLM_BACKEND", "openai")  # "local" or "openai" or "cloudflare" or "stub" (server/llm_stub.py)
 
-# API Clients
-local_client = OpenAI(base_url="http://localhost:1234/v1//chat/completions", api_key="lm-studio")
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
-cloudflare_client = OpenAI(
-    base_url=f"https://api.cloudflare.com/client/v4/accounts/{CLOUDFLARE_ACCOUNT_ID}/ai/v1",
-    api_key=CLOUDFLARE_API_KEY
-)
+# === Serving ===
+# CPU-bound scoring (SQLite + pandas + XGBoost) runs off the event loop in this pool
+WORKER_POOL_SIZE = int(os.environ.get("AI25_WORKER_POOL_SIZE", os.cpu_count() or 4))
+# "thread" shares one loaded model (XGBoost and SQLite release the GIL); "process" loads one per worker
+WORKER_POOL_KIND = os.environ.get("AI25_WORKER_POOL_KIND", "thread")
+# /predict/batch scores inputs in chunks of this size (one bulk SQL join + one model call each)
+BATCH_CHUNK_SIZE = int(os.environ.get("AI25_BATCH_CHUNK_SIZE", 256))
+# Batch chunks run in their own pool, so however many batches arrive they never queue ahead of /predict
+BATCH_WORKER_POOL_SIZE = int(os.environ.get("AI25_BATCH_WORKER_POOL_SIZE", max(1, WORKER_POOL_SIZE // 2)))
+# Chunks of one batch request in the batch pool at once, so concurrent batches take turns
+BATCH_PARALLEL_CHUNKS = int(os.environ.get("AI25_BATCH_PARALLEL_CHUNKS", max(1, BATCH_WORKER_POOL_SIZE // 2)))
+# Load model, dataset, cube and rules at startup (/readyz turns green when done) instead of on the first request
+PRELOAD_ON_STARTUP = os.environ.get("AI25_PRELOAD", "1") != "0"
+# After a failed preload, requests get 503 and the preload is retried at most this often
+PRELOAD_RETRY_S = float(os.environ.get("AI25_PRELOAD_RETRY_S", 30))
+
+# === Admission control (server/admission.py) ===
+MAX_ACTIVE_REQUESTS = int(os.environ.get("AI25_MAX_ACTIVE_REQUESTS", 4 * WORKER_POOL_SIZE))
+# Most slots a class may hold; batch jobs never take more than this many
+BATCH_MAX_ACTIVE = int(os.environ.get("AI25_BATCH_MAX_ACTIVE", max(1, WORKER_POOL_SIZE // 2)))
+QUERY_MAX_ACTIVE = int(os.environ.get("AI25_QUERY_MAX_ACTIVE", 3 * WORKER_POOL_SIZE))
+# Waiting requests per class before answering 503
+INTERACTIVE_QUEUE_LIMIT = int(os.environ.get("AI25_INTERACTIVE_QUEUE_LIMIT", 256))
+QUERY_QUEUE_LIMIT = int(os.environ.get("AI25_QUERY_QUEUE_LIMIT", 64))
+BATCH_QUEUE_LIMIT = int(os.environ.get("AI25_BATCH_QUEUE_LIMIT", 4))
+# Active + queued requests per client (X-Client-Id header, else remote address) before 429
+PER_CLIENT_LIMIT = int(os.environ.get("AI25_PER_CLIENT_LIMIT", 16))
+QUEUE_TIMEOUT_S = float(os.environ.get("AI25_QUEUE_TIMEOUT_S", 10))
+
+# === LLM clients ===
+# Built on first use (the openai import alone takes ~0.7s and keys are only read then),
+# sharing one keep-alive connection pool per sync/async side, sized for concurrent /query calls
+LLM_MAX_CONNECTIONS = int(os.environ.get("AI25_LLM_MAX_CONNECTIONS", max(QUERY_MAX_ACTIVE, 16)))
+LLM_KEEPALIVE_EXPIRY_S = float(os.environ.get("AI25_LLM_KEEPALIVE_EXPIRY_S", 30))
+LLM_TIMEOUT_S = float(os.environ.get("AI25_LLM_TIMEOUT_S", 60))
+# Offline OpenAI-compatible stub (python -m server.llm_stub), used by mode "stub"
+STUB_URL = os.environ.get("AI25_STUB_URL", "http://127.0.0.1:8765/v1")
+# Fixed so autogen-style response caching is reused across runs (was random per import)
+CACHE_SEED = int(os.environ.get("AI25_CACHE_SEED", 42))
 
 # Embedding Models
 local_embedding_model = "nomic-ai/nomic-embed-text-v1.5-GGUF"
@@ -20,46 +52,180 @@ cloudflare_embedding_model = "@cf/baai/bge-base-en-v1.5"
 openai_embedding_model = "text-embedding-3-small"
 
 # Completion Models
-gpt4o= [{
-    "model": "gpt-4o-mini",
-    "api_key": OPENAI_API_KEY,
-    "cache_seed": random.randint(0, 100000),
-}]
-
-llama3 = [{
-    "model": "lmstudio-community/Meta-Llama-3.1-8B-Instruct-Q4_K_M.gguf",
-    "api_key": "meta-llama-3.1-8b-instruct",
-    "api_type": "openai",
-    "base_url": "http://127.0.0.1:1234",
-    "cache_seed": random.randint(0, 100000),
-}]
-
+gpt4o_model = "gpt-4o-mini"
+llama3_model = "lmstudio-community/Meta-Llama-3.1-8B-Instruct-Q4_K_M.gguf"
 cloudflare_model = "@hf/nousresearch/hermes-2-pro-mistral-7b"
 
+BACKENDS = {
+    "local": {"completion_model": llama3_model, "embedding_model": local_embedding_model},
+    "openai": {"completion_model": gpt4o_model, "embedding_model": openai_embedding_model},
+    "cloudflare": {"completion_model": cloudflare_model, "embedding_model": cloudflare_embedding_model},
+    "stub": {"completion_model": "stub-chat", "embedding_model": "stub-embed"},
+}
+
+def _key(name):
+    """
+    API key from server/keys.py, else the environment.
+    """
+    try:
+        import server.keys as keys
+        return getattr(keys, name)
+    except (ImportError, AttributeError):
+        return os.environ.get(name, "")
+
+def _client_kwargs(backend):
+    if backend == "local":
+        return {"base_url": "http://localhost:1234/v1", "api_key": "lm-studio"}
+    if backend == "openai":
+        return {"api_key": _key("OPENAI_API_KEY")}
+    if backend == "cloudflare":
+        return {
+            "base_url": f"https://api.cloudflare.com/client/v4/accounts/{_key('CLOUDFLARE_ACCOUNT_ID')}/ai/v1",
+            "api_key": _key("CLOUDFLARE_API_KEY"),
+        }
+    if backend == "stub":
+        return {"base_url": STUB_URL, "api_key": "stub"}
+    raise ValueError("Please specify if you want to run local or openai models")
+
+
+class ClientRegistry:
+    """
+    One OpenAI / AsyncOpenAI client per backend, constructed on first use.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clients = {}  # (backend, is_async) -> client
+        self.http = {}     # is_async -> shared connection pool
+
+    def _pool(self, is_async):
+        if is_async not in self.http:
+            import openai
+            try:
+                import httpx2 as httpx  # the HTTP package openai >= 3 is built on
+            except ImportError:
+                import httpx
+            options = {
+                "limits": httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                    keepalive_expiry=LLM_KEEPALIVE_EXPIRY_S,
+                ),
+                "timeout": httpx.Timeout(LLM_TIMEOUT_S, connect=5.0),
+            }
+            self.http[is_async] = openai.DefaultAsyncHttpxClient(**options) if is_async else openai.DefaultHttpxClient(**options)
+        return self.http[is_async]
+
+    def get(self, backend=None, is_async=False):
+        backend = backend or mode
+        key = (backend, is_async)
+        client = self.clients.get(key)
+        if client is None:
+            with self.lock:
+                client = self.clients.get(key)
+                if client is None:
+                    from openai import OpenAI, AsyncOpenAI
+                    kwargs = _client_kwargs(backend)
+                    cls = AsyncOpenAI if is_async else OpenAI
+                    client = self.clients[key] = cls(http_client=self._pool(is_async), **kwargs)
+                    print(f"[DEBUG] Built {'async ' if is_async else ''}LLM client for backend '{backend}'")
+        return client
+
+    async def aclose(self):
+        """
+        Closes the async pool (API shutdown); the next call builds a new one.
+        """
+        with self.lock:
+            pool = self.http.pop(True, None)
+            for key in [k for k in self.clients if k[1]]:
+                del self.clients[key]
+        if pool is not None:
+            await pool.aclose()
+
+    def stats(self):
+        with self.lock:
+            return {"clients": len(self.clients), "pools": len(self.http), "max_connections": LLM_MAX_CONNECTIONS}
+
+
+client_registry = ClientRegistry()
+
+
+class LazyClient:
+    """
+    Stands in for an OpenAI client; attribute access goes to the registry's client for
+    the backend (default: the current `mode`), so importing this module builds nothing.
+    """
+
+    def __init__(self, backend=None, is_async=False):
+        self._backend = backend
+        self._async = is_async
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(client_registry.get(self._backend, self._async), name)
+
+    def __repr__(self):
+        return f"<LazyClient backend={self._backend or mode} async={self._async}>"
+
+
+# API Clients
+local_client = LazyClient("local")
+openai_client = LazyClient("openai")
+cloudflare_client = LazyClient("cloudflare")
+
+# Async twins for the API server (never block the event loop on an LLM call)
+local_async_client = LazyClient("local", is_async=True)
+openai_async_client = LazyClient("openai", is_async=True)
+cloudflare_async_client = LazyClient("cloudflare", is_async=True)
+
 # Define what models to use according to chosen "mode"
 def api_mode(mode):
-    if mode == "local":
-        client = local_client
-        completion_model = llama3[0]['model']
-        embedding_model = local_embedding_model
-        return client, completion_model, embedding_model
-
-    if mode == "cloudflare":
-        client = cloudflare_client
-        completion_model = cloudflare_model
-        embedding_model = cloudflare_embedding_model
-        return client, completion_model, embedding_model
-
-    elif mode == "openai":
-        client = openai_client
-        completion_model = gpt4o[0]['model']
-        embedding_model = openai_embedding_model
-        return client, completion_model, embedding_model
-    else:
+    if mode not in BACKENDS:
         raise ValueError("Please specify if you want to run local or openai models")
+    return LazyClient(mode), BACKENDS[mode]["completion_model"], BACKENDS[mode]["embedding_model"]
 
 client, completion_model, embedding_model = api_mode(mode)
 
+def async_api_client(mode):
+    if mode not in BACKENDS:
+        raise ValueError("Please specify if you want to run local or openai models")
+    return LazyClient(mode, is_async=True)
+
+async_client = async_api_client(mode)
+
+def llm_backend(site):
+    """
+    Client pair and models for one call site ("extract", "summary", "guidance", "rag",
+    "chatbot"); AI25_LLM_BACKEND_<SITE> overrides the global mode, e.g.
+    AI25_LLM_BACKEND_EXTRACT=local keeps extraction on LM Studio while summaries use OpenAI.
+    """
+    backend = os.environ.get(f"AI25_LLM_BACKEND_{site.upper()}", mode)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend {backend!r} for {site}")
+    return SimpleNamespace(
+        name=backend,
+        client=LazyClient(backend),
+        async_client=LazyClient(backend, is_async=True),
+        **BACKENDS[backend],
+    )
+
+def __getattr__(name):
+    # Legacy names that read keys: resolved on access only
+    if name in ("OPENAI_API_KEY", "CLOUDFLARE_ACCOUNT_ID", "CLOUDFLARE_API_KEY"):
+        return _key(name)
+    if name == "gpt4o":
+        return [{"model": gpt4o_model, "api_key": _key("OPENAI_API_KEY"), "cache_seed": CACHE_SEED}]
+    if name == "llama3":
+        return [{
+            "model": llama3_model,
+            "api_key": "meta-llama-3.1-8b-instruct",
+            "api_type": "openai",
+            "base_url": "http://127.0.0.1:1234",
+            "cache_seed": CACHE_SEED,
+        }]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 # === SQL Schema Utils ===
 def get_dB_schema(db_path):
     """
@@ -0,0 +1,135 @@
+# server/llm_stub.py
+
+"""
+Offline OpenAI-compatible stub for benchmarks and tests.
+
+Serves /v1/chat/completions (plain and streamed), /v1/embeddings and /v1/models with
+deterministic answers and a configurable latency, so the whole pipeline can run
+without network or API keys:
+
+    python -m server.llm_stub --port 8765 --latency-ms 300
+    AI25_LLM_BACKEND=stub python main.py
+
+Extraction prompts are answered by the rule-based extractor (a Python dict, like the
+real model returns); everything else gets a short canned summary of the prompt.
+Embeddings are hashed n-gram vectors of the requested size.
+"""
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+from utils import rule_extractor
+from utils.semantic_cache import hashed_embedding
+
+LATENCY_S = float(os.environ.get("AI25_STUB_LATENCY_MS", 0)) / 1000
+TOKEN_DELAY_S = float(os.environ.get("AI25_STUB_TOKEN_DELAY_MS", 0)) / 1000
+DEFAULT_EMBEDDING_DIM = 768  # same size as the stored guidance / table vectors
+
+app = FastAPI(title="AI25 LLM stub")
+
+
+# === Canned answers ===
+def _content(messages):
+    system = " ".join(m.get("content", "") for m in messages if m.get("role") == "system")
+    user = " ".join(m.get("content", "") for m in messages if m.get("role") == "user")
+    if "valid Python dictionary" in system:
+        question = user.split("User Question:", 1)[-1].strip()
+        return repr(rule_extractor.extract(question).fields)
+    lines = [line.strip() for line in user.splitlines() if line.strip()]
+    preview = " ".join(lines)[:200]
+    return f"Stub answer ({len(lines)} prompt lines). {preview}"
+
+def _usage(messages, content):
+    prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in messages)
+    completion_tokens = len(content.split())
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+# === Endpoints ===
+@app.get("/v1/models")
+async def models():
+    return {"object": "list", "data": [{"id": "stub-chat", "object": "model"}, {"id": "stub-embed", "object": "model"}]}
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    messages = body.get("messages", [])
+    model = body.get("model", "stub-chat")
+    content = _content(messages)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    created = int(time.time())
+    if LATENCY_S:
+        await asyncio.sleep(LATENCY_S)
+
+    if body.get("stream"):
+        async def events():
+            words = content.split(" ")
+            for i, word in enumerate(words):
+                delta = {"content": word if i == 0 else " " + word}
+                if i == 0:
+                    delta["role"] = "assistant"
+                chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                         "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+                if TOKEN_DELAY_S:
+                    await asyncio.sleep(TOKEN_DELAY_S)
+            done = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            yield f"data: {json.dumps(done)}\n\n"
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": _usage(messages, content),
+    }
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    inputs = body.get("input", [])
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    dim = int(body.get("dimensions") or DEFAULT_EMBEDDING_DIM)
+    if LATENCY_S:
+        await asyncio.sleep(LATENCY_S)
+    data = [{"object": "embedding", "index": i, "embedding": hashed_embedding(str(text), dim=dim).tolist()}
+            for i, text in enumerate(inputs)]
+    tokens = sum(len(str(text).split()) for text in inputs)
+    return {"object": "list", "data": data, "model": body.get("model", "stub-embed"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline OpenAI-compatible LLM stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=None, help="Delay before every response")
+    parser.add_argument("--token-delay-ms", type=float, default=None, help="Delay between streamed tokens")
+    args = parser.parse_args()
+    if args.latency_ms is not None:
+        LATENCY_S = args.latency_ms / 1000
+    if args.token_delay_ms is not None:
+        TOKEN_DELAY_S = args.token_delay_ms / 1000
+    try:
+        import uvicorn
+    except ImportError:
+        print("❌ uvicorn is required to run the stub server (pip install uvicorn)")
+        sys.exit(1)
+    print(f"🧪 LLM stub on http://{args.host}:{args.port}/v1 (set AI25_LLM_BACKEND=stub)")
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,62 @@
+# server/worker_pool.py
+
+"""
+Bounded worker pools for CPU-bound scoring (SQLite lookups, pandas, XGBoost).
+
+Async handlers await run_cpu(fn, ...) instead of calling the pipeline directly, so the
+event loop keeps serving other requests while a scenario is scored. /predict/batch
+chunks go through run_batch(fn, ...), a separate, smaller pool: executors are FIFO, so
+sharing one would put interactive requests behind every queued chunk. Pool sizes and
+kind (thread / process) come from server/config.py.
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from server.config import WORKER_POOL_KIND, WORKER_POOL_SIZE, BATCH_WORKER_POOL_SIZE
+
+POOL_SIZES = {"interactive": WORKER_POOL_SIZE, "batch": BATCH_WORKER_POOL_SIZE}
+
+_executors = {}
+_executor_lock = threading.Lock()
+
+
+def get_executor(pool="interactive"):
+    """
+    Shared executor for a pool ("interactive" or "batch"), created on first use.
+    """
+    with _executor_lock:
+        if pool not in _executors:
+            size = POOL_SIZES[pool]
+            if WORKER_POOL_KIND == "process":
+                _executors[pool] = ProcessPoolExecutor(max_workers=size)
+            else:
+                _executors[pool] = ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"ai25-{pool}")
+            print(f"[DEBUG] {pool.capitalize()} worker pool started: {size} {WORKER_POOL_KIND} workers")
+        return _executors[pool]
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """
+    Runs fn(*args, **kwargs) in the interactive pool and awaits the result.
+    With a process pool fn and its arguments must be picklable (module-level functions).
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(fn, *args, **kwargs))
+
+
+async def run_batch(fn, *args, **kwargs):
+    """
+    run_cpu for batch work: runs in the batch pool, never in front of interactive requests.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor("batch"), functools.partial(fn, *args, **kwargs))
+
+
+def shutdown(wait=True):
+    with _executor_lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=wait)
+        _executors.clear()
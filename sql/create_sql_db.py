@@ -1,6 +1,28 @@
 # sql/create_sql_db.py
 
+"""
+Builds / refreshes comfort-database.db from the Ecoform CSV.
+
+The CSV is streamed in chunks. Rows are keyed on their content (a hash of the raw CSV
+text, plus an ordinal for exact duplicates), so inserting or deleting a line does not
+disturb the rows after it: only rows with new keys are inserted, in one transaction per
+chunk, and rows whose keys disappeared from the CSV are deleted (an edited row is both).
+Each run that changes something records a dataset version in dataset_meta.
+
+A full rebuild happens on --full or when the CSV's columns changed. Column types are
+inferred over the whole CSV, the tables are built under staging names and swapped in
+with one transaction, so readers never see a partially filled comfort_lookup.
+An FTS5 index over element_materials_string is kept in sync by triggers.
+
+Usage:
+    python sql/create_sql_db.py [--csv PATH] [--db PATH] [--chunksize N] [--full]
+"""
+
+import argparse
+import hashlib
+import json
 import sqlite3
+import time
 import pandas as pd
 import os
 import sys
@@ -9,46 +31,398 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from utils.column_cleaner import fully_standardize_dataframe
+from utils.dataset_snapshot import source_signature
+from utils.prediction_cache import file_fingerprint
+from utils.format_interpreter import parse_element_materials
+from utils.feature_index import clean_key
 
 # File paths
 CSV_PATH = "sql/Ecoform_Dataset_v1.csv"
 DB_PATH = "sql/comfort-database.db"
+CHUNKSIZE = 5000
+
+# Cleaned match keys added on top of the CSV's columns
+CLEAN_COLUMNS = {
+    "apartment_type_string_clean": "apartment_type_string",
+    "zone_string_clean": "zone_string",
+    "element_materials_string_clean": "element_materials_string",
+}
+
+# Lookup indexes: equality on the cleaned keys, then comfort order, so
+# sql_calls' "best row for these keys" is an index seek with no sort
+INDEXES = {
+    "idx_lookup_apt_zone_period": 'comfort_lookup(apartment_type_string_clean, zone_string_clean, "day/nightstring", comfort_index_float DESC)',
+    "idx_lookup_element_apt_zone_period": 'comfort_lookup(element_materials_string_clean, apartment_type_string_clean, zone_string_clean, "day/nightstring", comfort_index_float DESC)',
+    "idx_lookup_zone": 'comfort_lookup(zone_string_clean, comfort_index_float DESC)',
+    "idx_materials_name": 'materials(name_clean, element_type)',
+    "idx_lookup_materials_row": 'comfort_lookup_materials(row_id, material_id)',
+}
+
+FTS_TRIGGERS = {
+    "comfort_lookup_fts_insert": """AFTER INSERT ON comfort_lookup BEGIN
+        INSERT INTO comfort_lookup_fts (rowid, element_materials_string) VALUES (new.row_id, new.element_materials_string);
+    END""",
+    "comfort_lookup_fts_delete": """AFTER DELETE ON comfort_lookup BEGIN
+        INSERT INTO comfort_lookup_fts (comfort_lookup_fts, rowid, element_materials_string) VALUES ('delete', old.row_id, old.element_materials_string);
+    END""",
+    "comfort_lookup_fts_update": """AFTER UPDATE OF element_materials_string ON comfort_lookup BEGIN
+        INSERT INTO comfort_lookup_fts (comfort_lookup_fts, rowid, element_materials_string) VALUES ('delete', old.row_id, old.element_materials_string);
+        INSERT INTO comfort_lookup_fts (rowid, element_materials_string) VALUES (new.row_id, new.element_materials_string);
+    END""",
+}
+
+
+# === Reading ===
+def read_chunks(csv_path, chunksize):
+    """
+    Yields raw chunks with every value kept as CSV text.
+    """
+    for chunk in pd.read_csv(csv_path, dtype=str, chunksize=chunksize):
+        yield fully_standardize_dataframe(chunk)
+
+
+def csv_columns(csv_path):
+    return list(fully_standardize_dataframe(pd.read_csv(csv_path, dtype=str, nrows=0)).columns)
+
+
+def hash_rows(raw):
+    """
+    Row hashes over the raw text, so they do not depend on dtype inference.
+    """
+    values = raw.fillna("\x00").astype(str).agg("\x1f".join, axis=1)
+    return [hashlib.sha1(v.encode("utf-8")).hexdigest() for v in values]
+
+
+def row_keys(raw, seen_counts):
+    """
+    Content keys for a chunk: row hash plus its ordinal among identical rows so far.
+    """
+    keys = []
+    for row_hash in hash_rows(raw):
+        n = seen_counts.get(row_hash, 0)
+        seen_counts[row_hash] = n + 1
+        keys.append(f"{row_hash}:{n}")
+    return keys
+
+
+def infer_column_types(csv_path, chunksize):
+    """
+    SQL type per CSV column over all chunks: INTEGER / REAL when every present value
+    parses as one, else TEXT.
+    """
+    numeric, integral = {}, {}
+    for raw in read_chunks(csv_path, chunksize):
+        for col in raw.columns:
+            present = raw[col].dropna()
+            converted = pd.to_numeric(present, errors="coerce")
+            numeric[col] = numeric.get(col, True) and bool(converted.notna().all())
+            integral[col] = integral.get(col, True) and numeric[col] and bool((converted % 1 == 0).all())
+    return {col: "INTEGER" if integral[col] else "REAL" if numeric[col] else "TEXT" for col in numeric}
+
+
+def prepare_chunk(raw, types, keys):
+    """
+    Chunk ready for insertion: numeric columns parsed (values that do not parse stay
+    text, nothing is lost), cleaned keys and row_key.
+    """
+    df = raw.copy()
+    for col in df.columns:
+        if types.get(col, "TEXT") != "TEXT":
+            converted = pd.to_numeric(df[col], errors="coerce")
+            df[col] = converted.astype(object).where(converted.notna() | df[col].isna(), df[col])
+    for clean_col, source_col in CLEAN_COLUMNS.items():
+        if source_col in df.columns:
+            df[clean_col] = df[source_col].str.lower().str.replace(' ', '').str.replace('-', '')
+    df.insert(0, "row_key", keys)
+    return df
+
+
+# === Schema ===
+LIVE_TABLES = {"lookup": "comfort_lookup", "materials": "materials", "links": "comfort_lookup_materials"}
+STAGING_TABLES = {name: f"{table}_staging" for name, table in LIVE_TABLES.items()}
+
+
+def table_columns(conn, table):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+def table_types(conn, table):
+    return {row[1]: row[2] or "TEXT" for row in conn.execute(f'PRAGMA table_info("{table}")')}
+
+
+def expected_columns(columns):
+    return ["row_id", "row_key"] + list(columns) + [c for c, source in CLEAN_COLUMNS.items() if source in columns]
+
+
+def create_tables(conn, columns, types, tables):
+    """
+    Creates empty comfort_lookup / materials / junction tables under the given names.
+    """
+    for table in (tables["links"], tables["materials"], tables["lookup"]):
+        conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+
+    column_defs = ['"row_id" INTEGER PRIMARY KEY AUTOINCREMENT', '"row_key" TEXT NOT NULL UNIQUE']
+    for col in expected_columns(columns)[2:]:
+        column_defs.append(f'"{col}" {types.get(col, "TEXT")}')
+    conn.execute(f'CREATE TABLE "{tables["lookup"]}" ({", ".join(column_defs)})')
 
-# Load dataset
-df = pd.read_csv(CSV_PATH)
-
-# Apply full universal cleaner (both cleaning + renaming)
-df = fully_standardize_dataframe(df)
-# Add cleaned columns for robust matching
-if 'apartment_type_string' in df.columns:
-    df['apartment_type_string_clean'] = df['apartment_type_string'].str.lower().str.replace(' ', '').str.replace('-', '')
-if 'zone_string' in df.columns:
-    df['zone_string_clean'] = df['zone_string'].str.lower().str.replace(' ', '').str.replace('-', '')
-
-# Connect to SQLite
-conn = sqlite3.connect(DB_PATH)
-cursor = conn.cursor()
-
-# Drop existing table if exists
-cursor.execute("DROP TABLE IF EXISTS comfort_lookup")
-
-# Dynamically define SQL table schema
-column_defs = []
-for col, dtype in zip(df.columns, df.dtypes):
-    if pd.api.types.is_integer_dtype(dtype):
-        sql_type = 'INTEGER'
-    elif pd.api.types.is_float_dtype(dtype):
-        sql_type = 'REAL'
+    # === Normalized materials: one row per (element type, material) + row junction ===
+    conn.execute(f"""
+        CREATE TABLE "{tables["materials"]}" (
+            material_id INTEGER PRIMARY KEY,
+            element_type TEXT NOT NULL,
+            name TEXT NOT NULL,
+            name_clean TEXT NOT NULL,
+            UNIQUE (element_type, name)
+        )
+    """)
+    conn.execute(f"""
+        CREATE TABLE "{tables["links"]}" (
+            material_id INTEGER NOT NULL REFERENCES "{tables["materials"]}"(material_id),
+            row_id INTEGER NOT NULL REFERENCES "{tables["lookup"]}"(row_id),
+            PRIMARY KEY (material_id, row_id)
+        ) WITHOUT ROWID
+    """)
+
+
+def swap_in_staging(conn):
+    """
+    Replaces the live tables with the staging ones in a single transaction
+    (FTS index and lookup indexes are rebuilt inside it).
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DROP TABLE IF EXISTS comfort_lookup_fts")
+        for name in ("links", "materials", "lookup"):
+            conn.execute(f'DROP TABLE IF EXISTS "{LIVE_TABLES[name]}"')
+        for name in ("lookup", "materials", "links"):
+            conn.execute(f'ALTER TABLE "{STAGING_TABLES[name]}" RENAME TO "{LIVE_TABLES[name]}"')
+        ensure_fts(conn)
+        create_indexes(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def ensure_fts(conn):
+    """
+    FTS5 index over element_materials_string, kept in sync with comfort_lookup by
+    triggers (external content table, so the text is not stored twice).
+    Builds the index from existing rows when it is missing.
+    """
+    if not table_columns(conn, "comfort_lookup"):
+        return
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'comfort_lookup_fts'"
+    ).fetchone()
+    if not exists:
+        conn.execute("""
+            CREATE VIRTUAL TABLE comfort_lookup_fts USING fts5(
+                element_materials_string,
+                content = 'comfort_lookup', content_rowid = 'row_id',
+                tokenize = 'porter unicode61'
+            )
+        """)
+    for name, body in FTS_TRIGGERS.items():
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+    if not exists:
+        conn.execute("INSERT INTO comfort_lookup_fts (comfort_lookup_fts) VALUES ('rebuild')")
+        print("🔎 Built full-text index over element materials")
+
+
+def create_meta_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS dataset_meta (
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            source TEXT,
+            source_size INTEGER,
+            source_mtime_ns INTEGER,
+            source_sha256 TEXT,
+            rows_total INTEGER,
+            rows_inserted INTEGER,
+            rows_deleted INTEGER,
+            full_rebuild INTEGER,
+            ingested_at REAL
+        )
+    """)
+    # Rows are keyed on content, so an edit is a delete plus an insert; older tables
+    # carried an always-zero rows_updated column
+    if "rows_updated" in table_columns(conn, "dataset_meta"):
+        conn.execute("ALTER TABLE dataset_meta DROP COLUMN rows_updated")
+
+
+def create_indexes(conn):
+    for name, target in INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+
+def latest_version(conn):
+    row = conn.execute(
+        "SELECT version, source_sha256 FROM dataset_meta ORDER BY version DESC LIMIT 1"
+    ).fetchone()
+    return row if row else (0, None)
+
+
+# === Inserts ===
+class MaterialLinker:
+    """
+    Keeps materials / comfort_lookup_materials in step with inserted rows.
+    """
+
+    def __init__(self, conn, tables=LIVE_TABLES):
+        self.conn = conn
+        self.tables = tables
+        self.ids = {(t, n): i for i, t, n in conn.execute(
+            f'SELECT material_id, element_type, name FROM "{tables["materials"]}"')}
+        self.parsed = {}
+
+    def material_id(self, pair):
+        if pair not in self.ids:
+            cursor = self.conn.execute(
+                f'INSERT INTO "{self.tables["materials"]}" (element_type, name, name_clean) VALUES (?, ?, ?)',
+                (pair[0], pair[1], clean_key(pair[1]))
+            )
+            self.ids[pair] = cursor.lastrowid
+        return self.ids[pair]
+
+    def link(self, row_ids, values):
+        links = []
+        for row_id, value in zip(row_ids, values):
+            if value not in self.parsed:
+                self.parsed[value] = parse_element_materials(value)
+            links.extend((self.material_id(pair), row_id) for pair in self.parsed[value])
+        self.conn.executemany(f'INSERT OR IGNORE INTO "{self.tables["links"]}" VALUES (?, ?)', links)
+        return len(links)
+
+
+def insert_new_rows(conn, df, linker, table):
+    """
+    Inserts the chunk's rows whose row_key is not stored yet. Returns the number inserted.
+    """
+    keys = json.dumps(list(df["row_key"]))
+    existing = {k for (k,) in conn.execute(
+        f'SELECT row_key FROM "{table}" WHERE row_key IN (SELECT value FROM json_each(?))', (keys,))}
+    new = df[~df["row_key"].isin(existing)]
+    if new.empty:
+        return 0
+
+    columns = list(new.columns)
+    quoted = ", ".join(f'"{c}"' for c in columns)
+    rows = [
+        tuple(None if pd.isna(v) else (v.item() if hasattr(v, "item") else v) for v in row)
+        for row in new.itertuples(index=False, name=None)
+    ]
+    conn.executemany(f'INSERT INTO "{table}" ({quoted}) VALUES ({", ".join(["?"] * len(columns))})', rows)
+    row_ids = dict(conn.execute(
+        f'SELECT row_key, row_id FROM "{table}" WHERE row_key IN (SELECT value FROM json_each(?))',
+        (json.dumps(list(new["row_key"])),)
+    ))
+    linker.link([row_ids[k] for k in new["row_key"]], new.get("element_materials_string", [None] * len(new)))
+    return len(new)
+
+
+def delete_missing_rows(conn):
+    """
+    Deletes rows whose keys are not in temp.seen_keys (gone from / edited in the CSV).
+    """
+    gone = "SELECT row_id FROM comfort_lookup WHERE row_key NOT IN (SELECT key FROM temp.seen_keys)"
+    conn.execute(f"DELETE FROM comfort_lookup_materials WHERE row_id IN ({gone})")
+    return conn.execute("DELETE FROM comfort_lookup WHERE row_key NOT IN (SELECT key FROM temp.seen_keys)").rowcount
+
+
+# === Main ingestion ===
+def ingest(csv_path=CSV_PATH, db_path=DB_PATH, chunksize=CHUNKSIZE, full=False):
+    started = time.time()
+    source_sha = file_fingerprint(csv_path)
+    signature = source_signature(csv_path)
+
+    conn = sqlite3.connect(db_path)
+    # WAL lets the pooled read-only connections in sql_calls keep reading while we write
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    with conn:
+        create_meta_table(conn)
+
+    columns = csv_columns(csv_path)
+    # Schema follows the CSV (and this script): rebuild when columns were added/removed/renamed
+    schema_current = table_columns(conn, "comfort_lookup") == expected_columns(columns)
+    if schema_current:
+        # Older layouts (no row_id) get their index from the staging swap instead
+        with conn:
+            ensure_fts(conn)
+    version, last_sha = latest_version(conn)
+    if not full and last_sha == source_sha and schema_current:
+        print(f"✅ {csv_path} unchanged since dataset version {version} - nothing to do")
+        conn.close()
+        return version
+
+    full = full or not schema_current
+    if full:
+        print("🔄 Full rebuild of comfort_lookup (staging tables, swapped in at the end)")
+        types = infer_column_types(csv_path, chunksize)
+        tables = STAGING_TABLES
+        with conn:
+            create_tables(conn, columns, types, tables)
     else:
-        sql_type = 'TEXT'
-    column_defs.append(f'"{col}" {sql_type}')
+        types = table_types(conn, "comfort_lookup")
+        tables = LIVE_TABLES
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS seen_keys (key TEXT PRIMARY KEY)")
+        conn.execute("DELETE FROM temp.seen_keys")
+    linker = MaterialLinker(conn, tables)
+
+    inserted = total = 0
+    seen_counts = {}
+    for raw in read_chunks(csv_path, chunksize):
+        keys = row_keys(raw, seen_counts)
+        df = prepare_chunk(raw, types, keys)
+        with conn:
+            if not full:
+                conn.executemany("INSERT INTO temp.seen_keys VALUES (?)", [(k,) for k in keys])
+            inserted += insert_new_rows(conn, df, linker, tables["lookup"])
+        total += len(df)
+        print(f"📥 {total} rows read ({inserted} new)")
+
+    if full:
+        # Every previous row is replaced by the swap
+        deleted = conn.execute("SELECT COUNT(*) FROM comfort_lookup").fetchone()[0] if table_columns(conn, "comfort_lookup") else 0
+        swap_in_staging(conn)
+    with conn:
+        if not full:
+            deleted = delete_missing_rows(conn)
+        conn.execute("DELETE FROM materials WHERE material_id NOT IN (SELECT material_id FROM comfort_lookup_materials)")
+        create_indexes(conn)
+        conn.execute(
+            "INSERT INTO dataset_meta (source, source_size, source_mtime_ns, source_sha256, rows_total, rows_inserted, "
+            "rows_deleted, full_rebuild, ingested_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (signature["source"], signature["size"], signature["mtime_ns"], source_sha, total,
+             inserted, deleted, int(full), time.time())
+        )
+    if inserted or deleted:
+        conn.execute("ANALYZE")
+    if full:
+        conn.execute("VACUUM")  # reclaim the pages of the dropped tables
+    version, _ = latest_version(conn)
+    # Fold the WAL back into the main file so its fingerprint reflects the new data
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+
+    print(
+        f"✅ Ecoform dataset version {version}: {total} rows "
+        f"({inserted} new, {deleted} deleted) in {time.time() - started:.1f}s"
+    )
+    return version
+
 
-# Create SQL table
-create_sql = f"CREATE TABLE comfort_lookup ({', '.join(column_defs)})"
-cursor.execute(create_sql)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or incrementally refresh the comfort lookup database.")
+    parser.add_argument("--csv", default=CSV_PATH, help="Ecoform dataset CSV")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite database to write")
+    parser.add_argument("--chunksize", type=int, default=CHUNKSIZE, help="rows per chunk / transaction")
+    parser.add_argument("--full", action="store_true", help="rebuild all tables (built under staging names, then swapped in)")
+    args = parser.parse_args(argv)
+    ingest(args.csv, args.db, args.chunksize, args.full)
 
-# Insert data into table
-df.to_sql("comfort_lookup", conn, if_exists="append", index=False)
-conn.close()
 
-print("✅ Ecoform dataset fully cleaned & inserted into SQL")
+if __name__ == "__main__":
+    main()
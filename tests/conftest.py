@@ -0,0 +1,9 @@
+# tests/conftest.py
+
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+# Model, dataset and database paths are relative to the repository root
+os.chdir(ROOT)
@@ -0,0 +1,127 @@
+# tests/test_create_sql_db.py
+
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from sql.create_sql_db import CSV_PATH, INDEXES, ingest
+from utils.column_cleaner import fully_standardize_dataframe
+
+ROWS = 200
+
+
+@pytest.fixture
+def source(tmp_path):
+    """
+    (csv path, db path, rows) for a small slice of the Ecoform CSV.
+    """
+    rows = pd.read_csv(CSV_PATH, dtype=str, nrows=ROWS)
+    csv_path = tmp_path / "ecoform.csv"
+    rows.to_csv(csv_path, index=False)
+    return str(csv_path), str(tmp_path / "comfort.db"), rows
+
+
+def count(db_path, sql):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(sql).fetchone()[0]
+
+
+def test_fresh_ingest_builds_lookup_materials_and_indexes(source):
+    csv_path, db_path, rows = source
+    assert ingest(csv_path, db_path, chunksize=64) == 1
+
+    assert count(db_path, "SELECT COUNT(*) FROM comfort_lookup") == ROWS
+    assert count(db_path, "SELECT COUNT(DISTINCT row_key) FROM comfort_lookup") == ROWS
+    assert count(db_path, "SELECT COUNT(*) FROM comfort_lookup WHERE zone_string_clean IS NULL") == 0
+    # Every row is linked to the materials its element string names
+    assert count(db_path, "SELECT COUNT(DISTINCT row_id) FROM comfort_lookup_materials") == ROWS
+    assert count(db_path, "SELECT COUNT(*) FROM materials") > 0
+    with sqlite3.connect(db_path) as conn:
+        indexes = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        meta = conn.execute("SELECT rows_total, rows_inserted, rows_deleted, full_rebuild FROM dataset_meta").fetchall()
+    assert set(INDEXES) <= indexes
+    assert meta == [(ROWS, ROWS, 0, 1)]
+
+
+def test_pre_series_database_is_rebuilt(source):
+    csv_path, db_path, rows = source
+    # Layout written by the original script: no row_id / row_key, no FTS, no dataset_meta
+    old = fully_standardize_dataframe(pd.read_csv(csv_path))
+    with sqlite3.connect(db_path) as conn:
+        old.to_sql("comfort_lookup", conn, index=False)
+
+    assert ingest(csv_path, db_path, chunksize=64) == 1
+    with sqlite3.connect(db_path) as conn:
+        columns = [row[1] for row in conn.execute('PRAGMA table_info("comfort_lookup")')]
+        meta = conn.execute("SELECT rows_inserted, rows_deleted, full_rebuild FROM dataset_meta").fetchall()
+        staging = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name LIKE '%_staging'").fetchone()[0]
+    assert columns[:2] == ["row_id", "row_key"]
+    assert meta == [(ROWS, ROWS, 1)]
+    assert staging == 0
+    assert count(db_path, "SELECT COUNT(*) FROM comfort_lookup") == ROWS
+
+
+def test_unchanged_csv_is_not_reingested(source):
+    csv_path, db_path, _ = source
+    assert ingest(csv_path, db_path, chunksize=64) == 1
+    assert ingest(csv_path, db_path, chunksize=64) == 1
+    assert count(db_path, "SELECT COUNT(*) FROM dataset_meta") == 1
+
+
+def test_incremental_ingest_applies_deleted_and_edited_rows(source):
+    csv_path, db_path, rows = source
+    ingest(csv_path, db_path, chunksize=64)
+    with sqlite3.connect(db_path) as conn:
+        kept_ids = dict(conn.execute("SELECT row_key, row_id FROM comfort_lookup"))
+
+    # Drop line 10 and edit line 100 (one value changes, so its content key does)
+    edited = rows.drop(index=10).copy()
+    column = edited.columns[-1]
+    edited.loc[100, column] = "123.456"
+    edited.to_csv(csv_path, index=False)
+
+    assert ingest(csv_path, db_path, chunksize=64) == 2
+    with sqlite3.connect(db_path) as conn:
+        meta = conn.execute(
+            "SELECT rows_total, rows_inserted, rows_deleted, full_rebuild FROM dataset_meta WHERE version = 2"
+        ).fetchone()
+        now_ids = dict(conn.execute("SELECT row_key, row_id FROM comfort_lookup"))
+        orphans = conn.execute(
+            "SELECT COUNT(*) FROM comfort_lookup_materials WHERE row_id NOT IN (SELECT row_id FROM comfort_lookup)"
+        ).fetchone()[0]
+    assert meta == (ROWS - 1, 1, 2, 0)
+    assert len(now_ids) == ROWS - 1
+    # Rows that did not change keep their ids
+    assert all(kept_ids[key] == row_id for key, row_id in now_ids.items() if key in kept_ids)
+    assert len(set(now_ids) - set(kept_ids)) == 1
+    assert orphans == 0
+
+
+def fts_rows(db_path, query):
+    with sqlite3.connect(db_path) as conn:
+        return {row_id for (row_id,) in conn.execute(
+            "SELECT rowid FROM comfort_lookup_fts WHERE comfort_lookup_fts MATCH ?", (query,))}
+
+
+def test_fts_index_follows_incremental_ingest(source):
+    csv_path, db_path, rows = source
+    ingest(csv_path, db_path, chunksize=64)
+    with sqlite3.connect(db_path) as conn:
+        like = {row_id for (row_id,) in conn.execute(
+            "SELECT row_id FROM comfort_lookup WHERE element_materials_string LIKE '%fiberglass%'")}
+    assert like and fts_rows(db_path, '"fiberglass"') == like
+
+    # Give one row a material no other row has
+    edited = rows.copy()
+    column = next(c for c in edited.columns if "element" in c.lower() and "material" in c.lower())
+    edited.loc[5, column] = "Wall: Zorbite Panel"
+    edited.to_csv(csv_path, index=False)
+    ingest(csv_path, db_path, chunksize=64)
+
+    with sqlite3.connect(db_path) as conn:
+        (zorbite_id,) = conn.execute(
+            "SELECT row_id FROM comfort_lookup WHERE element_materials_string = 'Wall: Zorbite Panel'").fetchone()
+        # Raises "database disk image is malformed" when index and table disagree
+        conn.execute("INSERT INTO comfort_lookup_fts (comfort_lookup_fts, rank) VALUES ('integrity-check', 1)")
+    assert fts_rows(db_path, '"zorbite"') == {zorbite_id}
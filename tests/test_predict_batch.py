@@ -0,0 +1,65 @@
+# tests/test_predict_batch.py
+
+import json
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+os.environ.setdefault("AI25_PRELOAD", "0")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import server.api_server as api_server  # noqa: E402
+
+
+def fake_query_many(inputs):
+    # Later chunks are quicker, so with several batch workers lines arrive out of input order
+    time.sleep(0.05 / (1 + inputs[0]["n"]))
+    if any(user_input.get("fail") for user_input in inputs):
+        raise RuntimeError("chunk failed")
+    return [{"comfort_score": user_input["n"] / 100} for user_input in inputs]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def pipeline():
+        return SimpleNamespace(query_many=fake_query_many)
+    monkeypatch.setattr(api_server, "pipeline", pipeline)
+    monkeypatch.setattr(api_server, "BATCH_CHUNK_SIZE", 2)
+    monkeypatch.setattr(api_server, "BATCH_PARALLEL_CHUNKS", 3)
+    return TestClient(api_server.app)
+
+
+def lines(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_every_input_answered_once_with_its_index(client):
+    inputs = [{"n": n} for n in range(9)]
+    response = client.post("/predict/batch", json=inputs)
+    assert response.status_code == 200
+    results = {line["index"]: line["result"] for line in lines(response)}
+    assert len(lines(response)) == len(inputs)
+    assert results == {n: {"comfort_score": n / 100} for n in range(9)}
+
+
+def test_failed_chunk_only_fails_its_own_inputs(client):
+    inputs = [{"n": n} for n in range(6)]
+    inputs[3]["fail"] = True
+    body = "\n".join(json.dumps(user_input) for user_input in inputs)
+    response = client.post("/predict/batch", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    results = {line["index"]: line["result"] for line in lines(response)}
+    assert sorted(results) == list(range(6))
+    # Chunk size 2: inputs 2 and 3 share the failing chunk
+    assert results[2] == results[3] == {"error": "chunk failed"}
+    assert all(results[n] == {"comfort_score": n / 100} for n in (0, 1, 4, 5))
+    assert api_server.admission.stats()["active"] == 0
+
+
+def test_invalid_batch_body_is_rejected(client):
+    assert client.post("/predict/batch", content="[1, 2]").status_code == 400
+    assert client.post("/predict/batch", content='{"n": 1}\nnot json',
+                       headers={"Content-Type": "application/x-ndjson"}).status_code == 400
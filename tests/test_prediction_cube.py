@@ -0,0 +1,38 @@
+# tests/test_prediction_cube.py
+
+import pytest
+
+from scripts.core.prediction_cube import PredictionCube, build_cube
+from scripts.core.recommend_recompute import _recommend_recompute
+from utils.format_interpreter import standardize_input
+
+SCENARIOS = [
+    {"zone": "Roadside-V1", "apartment_type": "1Bed"},
+    {"zone": "Roadside-V1", "apartment_type": "2Bed", "time_period": "night", "activity": "Sleeping"},
+    {"zone": "Roadside-V1", "apartment_type": "3Bed", "floor_level": 1, "wall_material": "Painted Brick"},
+    {"zone": "Roadside-V1", "apartment_type": "2Bed", "wall_material": "Fiberglass Board", "window_material": "Laminated Glass"},
+]
+
+
+@pytest.fixture(scope="module")
+def cube(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("cube") / "prediction-cube.db")
+    build_cube(path, max_floor=1)
+    return PredictionCube(path)
+
+
+@pytest.mark.parametrize("scenario", SCENARIOS)
+def test_cube_matches_live_inference(cube, scenario):
+    user_input = standardize_input(scenario)
+    cached = cube.lookup(user_input)
+    assert cached is not None
+    live = _recommend_recompute(user_input)
+    assert cached["comfort_score"] == live["comfort_score"]
+    assert cached["improved_score"] == live["improved_score"]
+    assert cached["compliance"]["status"] == live["compliance"]["status"]
+    assert cached["recommendations"] == live["recommendations"]
+
+
+def test_cube_leaves_continuous_inputs_to_the_model(cube):
+    assert cube.lookup(standardize_input({"zone": "Roadside-V1", "apartment_type": "1Bed", "floor_level": 2.5})) is None
+    assert cube.lookup(standardize_input({"zone": "Roadside-V1", "apartment_type": "1Bed", "laeq_db": 40})) is None
@@ -0,0 +1,47 @@
+# tests/test_sql_calls.py
+
+import pytest
+
+from scripts.core.sql_calls import fts_query, query_many, query_or_recommend, prediction_cache
+
+# SQL hits, a material search, cube / model fallbacks and an input without apartment type
+BULK_INPUTS = [
+    {"zone": "Roadside-V1", "apartment_type": "1Bed"},
+    {"zone": "Roadside-V1", "apartment_type": "1Bed", "activity": "Sleeping", "time_period": "night"},
+    {"zone": "Roadside-V1", "apartment_type": "2Bed", "wall_material": "Fiberglass Board"},
+    {"zone": "Roadside-V1", "apartment_type": "3Bed", "element_materials_string": "Wall: Fiberglass Board"},
+    {"zone": "Roadside-V1", "apartment_type": "2Bed", "floor_level": 2.5},
+    {"zone": "Roadside-V1"},
+]
+
+
+@pytest.fixture
+def uncached():
+    prediction_cache.clear()
+    yield
+    prediction_cache.clear()
+
+
+def test_fts_query_searches_material_words_only():
+    assert fts_query("wall with Fiberglass Board and glass") == '"fiberglass" "board" "glass"'
+    assert fts_query("fiberglass or carpet", any_term=True) == '"fiberglass" OR "carpet"'
+    assert fts_query("walls and windows") == ""
+
+
+def test_query_many_matches_query_or_recommend(uncached):
+    bulk = query_many(BULK_INPUTS)
+    for user_input, result in zip(BULK_INPUTS[:-1], bulk):
+        prediction_cache.clear()
+        assert result == query_or_recommend(user_input)
+    assert "error" in bulk[-1]
+    with pytest.raises(ValueError):
+        query_or_recommend(BULK_INPUTS[-1])
+
+
+def test_sql_hits_are_checked_for_compliance(uncached):
+    result = query_or_recommend(BULK_INPUTS[1])
+    assert result["source"] == "SQL+ML"
+    # Sleeping at night needs comfort >= 0.85 and LAeq <= 35 dB; the best matching row has neither
+    assert result["comfort_score"] < 0.85
+    assert result["compliance"]["status"] == "❌ Not Compliant"
+    assert {"Comfort Score", "ISO"} <= set(result["recommendations"])
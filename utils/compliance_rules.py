@@ -0,0 +1,224 @@
+# utils/compliance_rules.py
+
+"""
+Compiled compliance rules.
+
+All thresholds (zone LAeq ranges for day/night, the RT60 band, the WHO/ISO limits per
+activity from compliance_thresholds_extended.json and the comfort score thresholds) are
+loaded once into lookup arrays. evaluate() then checks any number of spaces at once on
+NumPy arrays and returns pass/fail masks plus reason codes per space.
+"""
+
+import json
+import threading
+
+import numpy as np
+
+from utils.metrics import timed
+from utils.reference_data import DAY_RANGES, NIGHT_RANGES, RT60_target, RT60_max_dev
+
+GUIDANCE_JSON = "knowledge/compliance_guidance.json"
+COMPLIANCE_JSON = "knowledge/compliance_thresholds_extended.json"
+
+# === Activity comfort thresholds ===
+ACTIVITY_THRESHOLDS = {
+    "Sleeping": 0.85, "Working": 0.75, "Learning": 0.80, "Living": 0.70,
+    "Healing": 0.80, "Co-working": 0.75, "Exercise": 0.60, "Dining": 0.65
+}
+DEFAULT_COMFORT_THRESHOLD = 0.7
+
+# === Lenient screening used for IFC spaces in the UI ===
+SPACE_RT60_MAX = 3.0
+SPACE_RT60_MIN = 0.2
+SPACE_SPL_MAX = 70
+
+# === Reason codes ===
+LAEQ_ZONE_RANGE = "LAEQ_ZONE_RANGE"
+RT60_RANGE = "RT60_RANGE"
+ISO_LAEQ_MAX = "ISO_LAEQ_MAX"
+ISO_RT60_MAX = "ISO_RT60_MAX"
+COMFORT_BELOW_THRESHOLD = "COMFORT_BELOW_THRESHOLD"
+SPACE_RT60_HIGH = "SPACE_RT60_HIGH"
+SPACE_RT60_LOW = "SPACE_RT60_LOW"
+SPACE_SPL_HIGH = "SPACE_SPL_HIGH"
+
+
+def _as_float_array(values, n):
+    """
+    None / non-numeric -> NaN, so every comparison on it fails (as the scalar checks did).
+    """
+    if np.isscalar(values) or values is None:
+        values = [values] * n
+    out = np.full(n, np.nan)
+    for i, value in enumerate(values):
+        try:
+            out[i] = np.nan if value is None else float(value)
+        except (TypeError, ValueError):
+            pass
+    return out
+
+
+def _as_list(values, n):
+    if isinstance(values, str) or values is None or np.isscalar(values):
+        return [values] * n
+    return list(values)
+
+
+class ComplianceResult:
+    """
+    Masks are boolean arrays (True = passes). reasons(i) lists the failed rule codes.
+    """
+
+    def __init__(self, masks, ranges, thresholds):
+        self.masks = masks
+        self.ranges = ranges
+        self.thresholds = thresholds
+        self.compliant = (
+            masks[LAEQ_ZONE_RANGE] & masks[RT60_RANGE] & masks[ISO_LAEQ_MAX]
+            & masks[ISO_RT60_MAX] & masks[COMFORT_BELOW_THRESHOLD]
+        )
+
+    def __len__(self):
+        return len(self.compliant)
+
+    def reasons(self, i):
+        return [code for code, mask in self.masks.items() if not mask[i]]
+
+    def reason_codes(self):
+        return [self.reasons(i) for i in range(len(self))]
+
+    def row(self, i):
+        """
+        Plain-Python view of one space, for building result dicts.
+        """
+        return {
+            "laeq_ok": bool(self.masks[LAEQ_ZONE_RANGE][i]),
+            "rt60_ok": bool(self.masks[RT60_RANGE][i]),
+            "iso_laeq_ok": bool(self.masks[ISO_LAEQ_MAX][i]),
+            "iso_rt60_ok": bool(self.masks[ISO_RT60_MAX][i]),
+            "comfort_ok": bool(self.masks[COMFORT_BELOW_THRESHOLD][i]),
+            "compliant": bool(self.compliant[i]),
+            "db_range": self.ranges[i],
+            "laeq_max": self.thresholds["laeq_max"][i],
+            "rt60_max": self.thresholds["rt60_max"][i],
+            "comfort_threshold": self.thresholds["comfort"][i],
+            "reasons": self.reasons(i),
+        }
+
+
+class ComplianceRules:
+    def __init__(self, compliance_json=COMPLIANCE_JSON, guidance_json=GUIDANCE_JSON):
+        self.guidance_json = guidance_json
+        self._guidance = None
+        self._guidance_lock = threading.Lock()
+
+        # Zone ranges -> index into [day_min, day_max] / [night_min, night_max] arrays
+        self.zones = sorted(set(DAY_RANGES) | set(NIGHT_RANGES))
+        self.zone_index = {zone: i for i, zone in enumerate(self.zones)}
+        self.day_ranges = np.array([DAY_RANGES.get(z, (np.nan, np.nan)) for z in self.zones], dtype=float).reshape(-1, 2)
+        self.night_ranges = np.array([NIGHT_RANGES.get(z, (np.nan, np.nan)) for z in self.zones], dtype=float).reshape(-1, 2)
+
+        self.rt60_min = RT60_target
+        self.rt60_max = RT60_max_dev
+
+        # WHO/ISO limits per activity
+        with open(compliance_json) as f:
+            self.iso_thresholds = {entry["use"]: entry for entry in json.load(f)}
+        self.activity_thresholds = dict(ACTIVITY_THRESHOLDS)
+        print(f"[DEBUG] Compliance rules compiled: {len(self.zones)} zones, {len(self.iso_thresholds)} ISO uses")
+
+    # === Guidance text (loaded once) ===
+    @property
+    def guidance(self):
+        with self._guidance_lock:
+            if self._guidance is None:
+                with open(self.guidance_json) as f:
+                    self._guidance = json.load(f)
+            return self._guidance
+
+    def zone_range(self, zone, period='day'):
+        """
+        (min, max) for a zone and period, or None for unknown zones.
+        """
+        ranges = DAY_RANGES if str(period).lower() == 'day' else NIGHT_RANGES
+        return ranges.get(zone)
+
+    # === Vectorized evaluation ===
+    @timed("compliance")
+    def evaluate(self, zones, periods, activities, laeq, rt60, comfort):
+        """
+        Evaluates every space at once. Scalars are broadcast; None / NaN values fail
+        the checks that need them (ISO limits are only applied to present values).
+        """
+        lengths = [len(v) for v in (zones, periods, activities, laeq, rt60, comfort)
+                   if not (isinstance(v, str) or v is None or np.isscalar(v))]
+        n = max(lengths) if lengths else 1
+        zones = _as_list(zones, n)
+        periods = _as_list(periods, n)
+        activities = _as_list(activities, n)
+        laeq = _as_float_array(laeq, n)
+        rt60 = _as_float_array(rt60, n)
+        comfort = _as_float_array(comfort, n)
+
+        # Zone LAeq range (anything but "day" is checked against the night table)
+        zone_ids = np.array([self.zone_index.get(z, -1) for z in zones], dtype=int)
+        is_day = np.array([str(p).lower() == 'day' for p in periods], dtype=bool)
+        bounds = np.full((n, 2), np.nan)
+        known = zone_ids >= 0
+        bounds[known & is_day] = self.day_ranges[zone_ids[known & is_day]]
+        bounds[known & ~is_day] = self.night_ranges[zone_ids[known & ~is_day]]
+        with np.errstate(invalid='ignore'):
+            laeq_ok = (bounds[:, 0] <= laeq) & (laeq <= bounds[:, 1])
+            rt60_ok = (self.rt60_min <= rt60) & (rt60 <= self.rt60_max)
+
+        # WHO/ISO per-activity limits
+        laeq_max = np.array([self.iso_thresholds.get(a, {}).get("LAeq_max", np.inf) for a in activities], dtype=float)
+        rt60_max = np.array([self.iso_thresholds.get(a, {}).get("RT60_max", np.inf) for a in activities], dtype=float)
+        comfort_threshold = np.array([self.activity_thresholds.get(a, DEFAULT_COMFORT_THRESHOLD) for a in activities], dtype=float)
+        with np.errstate(invalid='ignore'):
+            # Missing or zero values are not held against the ISO limits
+            iso_laeq_ok = ~((laeq != 0) & (laeq > laeq_max))
+            iso_rt60_ok = ~((rt60 != 0) & (rt60 > rt60_max))
+            comfort_ok = comfort >= comfort_threshold
+
+        ranges = [self.zone_range(z, p) for z, p in zip(zones, periods)]
+        return ComplianceResult(
+            {
+                LAEQ_ZONE_RANGE: laeq_ok,
+                RT60_RANGE: rt60_ok,
+                ISO_LAEQ_MAX: iso_laeq_ok,
+                ISO_RT60_MAX: iso_rt60_ok,
+                COMFORT_BELOW_THRESHOLD: comfort_ok,
+            },
+            ranges,
+            {
+                "laeq_max": [self.iso_thresholds.get(a, {}).get("LAeq_max") for a in activities],
+                "rt60_max": [self.iso_thresholds.get(a, {}).get("RT60_max") for a in activities],
+                "comfort": comfort_threshold.tolist(),
+            },
+        )
+
+    def screen_spaces(self, rt60, spl):
+        """
+        Lenient geometry-stage screening of IFC spaces: {code: failing mask}.
+        """
+        n = len(rt60) if not np.isscalar(rt60) else 1
+        rt60 = _as_float_array(rt60, n)
+        spl = _as_float_array(spl, n)
+        with np.errstate(invalid='ignore'):
+            return {
+                SPACE_RT60_HIGH: rt60 > SPACE_RT60_MAX,
+                SPACE_RT60_LOW: rt60 < SPACE_RT60_MIN,
+                SPACE_SPL_HIGH: spl > SPACE_SPL_MAX,
+            }
+
+
+_rules = None
+_rules_lock = threading.Lock()
+
+def get_rules():
+    global _rules
+    with _rules_lock:
+        if _rules is None:
+            _rules = ComplianceRules()
+    return _rules
@@ -1,23 +1,23 @@
 import sys
 import os
 import json
-import pandas as pd
 
 # Add project root for config access
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from server.config import *  # uses embedding_model, mode, client
+from utils.dataset_snapshot import load_dataset
 
 # File paths
 input_file = "sql/Ecoform_Dataset_v1.csv"
 output_file = "knowledge/ecoform_dataset_vectors.json"
 
-# Load CSV
-df = pd.read_csv(input_file)
+# Load dataset (Arrow snapshot with cleaned column names, CSV fallback when stale)
+df = load_dataset(input_file)
 
 # Optionally: select/rename columns for clarity
 fields = [
     "apartment_type_string", "zone_string", "element_materials_string",
-    "floor_height_m", "l(a)eq_db", "rt60_s", "spl_db", "absorption_coefficient_by_area_m",
+    "floor_height_m", "laeq_db", "rt60_s", "spl_db", "absorption_coefficient_by_area_m",
     "total_surface_sqm"
 ]
 
@@ -30,7 +30,7 @@ for idx, row in df.iterrows():
         f"Zone: {row.get('zone_string', '')}, "
         f"Materials: {row.get('element_materials_string', '')}, "
         f"Floor height: {row.get('floor_height_m', '')}m, "
-        f"LAeq: {row.get('l(a)eq_db', '')} dB, "
+        f"LAeq: {row.get('laeq_db', '')} dB, "
         f"RT60: {row.get('rt60_s', '')} s, "
         f"SPL: {row.get('spl_db', '')} dB, "
         f"Absorption coefficient: {row.get('absorption_coefficient_by_area_m', '')}, "
@@ -0,0 +1,133 @@
+# utils/dataset_snapshot.py
+
+"""
+Columnar snapshot of the Ecoform dataset.
+
+The CSV is parsed and column-cleaned once and written as an uncompressed Arrow IPC
+(Feather v2) file with dictionary-encoded string columns, so readers can memory-map it
+instead of re-parsing the CSV. The snapshot records the size and mtime of the CSV it was
+built from; when the CSV changes the snapshot is considered stale, readers fall back to
+the CSV and the snapshot is rebuilt.
+
+Build it explicitly with:  python utils/dataset_snapshot.py
+"""
+
+import json
+import os
+import sys
+
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.column_cleaner import fully_standardize_dataframe
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    PYARROW_AVAILABLE = True
+except ImportError:
+    print("⚠️ pyarrow not available - Ecoform dataset will be read from CSV")
+    PYARROW_AVAILABLE = False
+
+CSV_PATH = "sql/Ecoform_Dataset_v1.csv"
+METADATA_KEY = b"ecoform_source"
+
+
+def snapshot_path_for(csv_path):
+    return os.path.splitext(csv_path)[0] + ".arrow"
+
+
+def source_signature(csv_path=CSV_PATH):
+    """
+    Cheap identity of the source CSV (path, size, mtime) used for staleness checks.
+    """
+    stat = os.stat(csv_path)
+    return {
+        "source": os.path.basename(csv_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def read_csv_standardized(csv_path=CSV_PATH):
+    df = pd.read_csv(csv_path)
+    return fully_standardize_dataframe(df)
+
+
+def build_snapshot(csv_path=CSV_PATH, snapshot_path=None, df=None):
+    """
+    Writes the cleaned dataset as a memory-mappable Arrow file next to the CSV.
+    Returns the snapshot path.
+    """
+    if not PYARROW_AVAILABLE:
+        raise RuntimeError("pyarrow is required to build the dataset snapshot")
+    snapshot_path = snapshot_path or snapshot_path_for(csv_path)
+    if df is None:
+        df = read_csv_standardized(csv_path)
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # Dictionary-encode string columns: the long element_materials_string values
+    # repeat heavily, so the string table is stored once per distinct value
+    columns = []
+    for column in table.columns:
+        if pa.types.is_string(column.type):
+            column = column.dictionary_encode()
+        columns.append(column)
+    table = pa.Table.from_arrays(columns, names=table.column_names)
+
+    metadata = dict(table.schema.metadata or {})
+    metadata[METADATA_KEY] = json.dumps(source_signature(csv_path)).encode()
+    table = table.replace_schema_metadata(metadata)
+
+    tmp_path = snapshot_path + ".tmp"
+    feather.write_feather(table, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, snapshot_path)
+    print(f"✅ Dataset snapshot written: {snapshot_path} ({table.num_rows} rows)")
+    return snapshot_path
+
+
+def _read_snapshot(csv_path, snapshot_path):
+    """
+    Returns the snapshot as a DataFrame, or None when it is missing or stale.
+    """
+    if not os.path.exists(snapshot_path):
+        return None
+    table = feather.read_table(snapshot_path, memory_map=True)
+    stored = (table.schema.metadata or {}).get(METADATA_KEY)
+    if stored is None or json.loads(stored) != source_signature(csv_path):
+        print(f"⚠️ Dataset snapshot is stale: {snapshot_path}")
+        return None
+    df = table.to_pandas()
+    # Dictionary columns come back as Categorical; readers expect plain object strings
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+    return df
+
+
+def load_dataset(csv_path=CSV_PATH):
+    """
+    Loads the cleaned Ecoform dataset, preferring the Arrow snapshot.
+    Falls back to parsing the CSV when the snapshot is missing, stale or unreadable,
+    and refreshes the snapshot so the next start is fast again.
+    """
+    if PYARROW_AVAILABLE:
+        snapshot_path = snapshot_path_for(csv_path)
+        try:
+            df = _read_snapshot(csv_path, snapshot_path)
+            if df is not None:
+                return df
+        except Exception as e:
+            print(f"⚠️ Could not read dataset snapshot: {e}")
+
+    df = read_csv_standardized(csv_path)
+    if PYARROW_AVAILABLE:
+        try:
+            build_snapshot(csv_path, df=df)
+        except Exception as e:
+            print(f"⚠️ Could not write dataset snapshot: {e}")
+    return df
+
+
+if __name__ == "__main__":
+    build_snapshot(sys.argv[1] if len(sys.argv) > 1 else CSV_PATH)
@@ -0,0 +1,139 @@
+# utils/feature_index.py
+
+import math
+
+import numpy as np
+
+
+def clean_key(value):
+    """
+    Normalizes an apartment/zone label the same way the *_clean columns are built.
+    """
+    return str(value).lower().replace(' ', '').replace('-', '')
+
+
+class FeatureIndex:
+    """
+    In-memory index over the standardized Ecoform dataset.
+    Per-(apartment_type_clean, zone_clean) numeric means are precomputed once,
+    so Tier 1 lookups in infer_features are a dict hit with no pandas involved.
+    """
+
+    def __init__(self, df, model_features):
+        df = df.copy()
+        df['apartment_type_string_clean'] = df['apartment_type_string'].str.lower().str.replace(' ', '').str.replace('-', '')
+        df['zone_string_clean'] = df['zone_string'].str.lower().str.replace(' ', '').str.replace('-', '')
+        self.df = df
+
+        numeric_columns = df.select_dtypes(include=['float64', 'int64']).columns
+        self.numeric_features = [col for col in numeric_columns if col in model_features]
+
+        # Means are taken group by group (same rows, same order as a boolean filter)
+        # so the values are bit-identical to the old per-call match[feature].mean()
+        self.pair_means = {}
+        self.pair_counts = {}
+        for key, group in df.groupby(['apartment_type_string_clean', 'zone_string_clean'], sort=False):
+            self.pair_means[key] = {feature: float(group[feature].mean()) for feature in self.numeric_features}
+            self.pair_counts[key] = len(group)
+
+        # Substring indexes for the Tier 2/3 partial matches
+        self.apartment_index = NGramIndex(df['apartment_type_string_clean'])
+        self.zone_index = NGramIndex(df['zone_string_clean'])
+        self.apartment_vocab = sorted(self.apartment_index.term_rows)
+        self.zone_vocab = sorted(self.zone_index.term_rows)
+        self._bitset_means = {}
+        print(f"[DEBUG] FeatureIndex built: {len(df)} rows, {len(self.pair_means)} apartment/zone pairs")
+
+    def exact_means(self, apartment_type_clean, zone_clean):
+        """
+        Returns (means, row_count) for an exact apartment + zone pair, or (None, 0).
+        """
+        key = (apartment_type_clean, zone_clean)
+        return self.pair_means.get(key), self.pair_counts.get(key, 0)
+
+    def partial_means(self, apartment_type_clean, zone_clean=None):
+        """
+        Substring fallback used by Tier 2 (apartment + zone) and Tier 3 (apartment only).
+        Matching rows are resolved by intersecting n-gram index bitsets; means are
+        cached per bitset. Returns (means, row_count) or (None, 0) when nothing matches.
+        """
+        rows = self.apartment_index.match(apartment_type_clean)
+        if zone_clean is not None and rows:
+            rows &= self.zone_index.match(zone_clean)
+        if not rows:
+            return None, 0
+        if rows not in self._bitset_means:
+            row_ids = bitset_to_row_ids(rows, len(self.df))
+            match = self.df.take(row_ids)
+            means = {feature: float(match[feature].mean()) for feature in self.numeric_features}
+            self._bitset_means[rows] = (means, len(row_ids))
+        return self._bitset_means[rows]
+
+
+class NGramIndex:
+    """
+    Character n-gram index over the distinct values of one cleaned label column.
+    match(query) returns a row-id bitset (Python int, bit i = row i) of every row whose
+    label contains query as a substring, without scanning the rows.
+    """
+
+    def __init__(self, values, n=3):
+        self.n = n
+        values = np.asarray(values, dtype=object)
+        self.term_rows = {}
+        for term in {v for v in values if isinstance(v, str)}:
+            self.term_rows[term] = mask_to_bitset(values == term)
+        self.gram_terms = {}
+        for term in self.term_rows:
+            for gram in self._grams(term):
+                self.gram_terms.setdefault(gram, set()).add(term)
+        self._cache = {}
+
+    def _grams(self, text):
+        return {text[i:i + self.n] for i in range(len(text) - self.n + 1)}
+
+    def matching_terms(self, query):
+        if len(query) < self.n:
+            candidates = self.term_rows.keys()
+        else:
+            candidates = None
+            for gram in self._grams(query):
+                terms = self.gram_terms.get(gram)
+                if not terms:
+                    return []
+                candidates = terms if candidates is None else candidates & terms
+        # n-gram hits are candidates only; confirm the substring
+        return [term for term in candidates if query in term]
+
+    def match(self, query):
+        if query not in self._cache:
+            if len(self._cache) >= 4096:
+                # Free-text queries are unbounded; keep the memo small
+                self._cache.clear()
+            rows = 0
+            for term in self.matching_terms(query):
+                rows |= self.term_rows[term]
+            self._cache[query] = rows
+        return self._cache[query]
+
+
+def mask_to_bitset(mask):
+    packed = np.packbits(np.asarray(mask, dtype=bool), bitorder='little')
+    return int.from_bytes(packed.tobytes(), 'little')
+
+
+def bitset_to_row_ids(bits, n_rows):
+    raw = np.frombuffer(bits.to_bytes((n_rows + 7) // 8, 'little'), dtype=np.uint8)
+    return np.flatnonzero(np.unpackbits(raw, bitorder='little')[:n_rows])
+
+
+def is_missing(value):
+    """
+    Cheap stand-in for pd.isna on scalar feature values.
+    """
+    if value is None:
+        return True
+    try:
+        return math.isnan(value)
+    except TypeError:
+        return False
@@ -3,6 +3,8 @@
 import pandas as pd
 import re
 
+from utils.metrics import timed
+
 # === 1️⃣ Column Cleaner ===
 def clean_columns(df):
     """
@@ -21,6 +23,7 @@ def clean_columns(df):
     return df
 
 # === 2️⃣ Input Key Mapper ===
+@timed("standardize_input")
 def standardize_input(user_input: dict):
     """
     Maps various user input keys into standard dataset keys.
@@ -93,6 +96,29 @@ def standardize_input(user_input: dict):
     
     return standardized
 
+# === 3️⃣ Element Materials Parser ===
+def parse_element_materials(element_materials):
+    """
+    Splits an element_materials_string ("Window: Wired Glass and Painted Brick; Wall: ...")
+    into unique (element_type, material) pairs. Window/door entries name their host wall
+    after " and ", which is recorded as a wall material.
+    """
+    pairs = []
+    if not isinstance(element_materials, str):
+        return pairs
+    for part in element_materials.split(';'):
+        element_type, _, names = part.partition(':')
+        element_type = element_type.strip().lower()
+        names = [names.strip()]
+        if element_type in ('window', 'door') and ' and ' in names[0]:
+            element, host = names[0].split(' and ', 1)
+            names = [element.strip()]
+            pairs.append(('wall', host.strip()))
+        for name in names:
+            if element_type and name:
+                pairs.append((element_type, name))
+    return list(dict.fromkeys(pair for pair in pairs if pair[1]))
+
 # === Optional: Small helper ===
 def preview_columns(file_path):
     df = pd.read_csv(file_path)
@@ -0,0 +1,245 @@
+# utils/llm_cache.py
+
+"""
+Content-addressed, on-disk cache for chat completions.
+
+The key is a SHA-256 over (model, messages - i.e. system and user prompts -,
+temperature and any other sampling arguments), so re-running the same building report
+replays identical prompts from SQLite instead of re-billing and re-waiting. The table
+is bounded by entry count and evicts the least recently used rows.
+
+Hits are plain reads: last-used times are collected in memory and, like new answers,
+written by a background thread. The async path does its read in a worker thread, so
+the API's event loop never touches SQLite.
+
+Modes (AI25_LLM_CACHE):
+- "on"      read and write (default)
+- "off"     bypass the cache
+- "refresh" always call the API and overwrite the stored answer
+- "replay"  read-through only: answers come from the cache and a miss raises
+            LLMCacheMiss instead of calling the API (tests / offline runs)
+"""
+
+import asyncio
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from utils.prediction_cache import canonical_hash
+
+LLM_CACHE_PATH = "sql/llm-cache.db"
+LLM_CACHE_MAX_ENTRIES = 5000
+LLM_CACHE_MODE = os.environ.get("AI25_LLM_CACHE", "on").lower()
+MODES = ("on", "off", "refresh", "replay")
+# Last-used times gathered before they are written without a new response to carry them
+TOUCH_BATCH = 64
+
+
+class LLMCacheMiss(LookupError):
+    pass
+
+
+def completion_key(model, messages, **params):
+    return canonical_hash({"model": model, "messages": messages, "params": params})
+
+
+class LLMResponseCache:
+    def __init__(self, path=LLM_CACHE_PATH, max_entries=LLM_CACHE_MAX_ENTRIES, mode=LLM_CACHE_MODE):
+        if mode not in MODES:
+            print(f"⚠️ Unknown LLM cache mode {mode!r} - using 'on'")
+            mode = "on"
+        self.path = path
+        self.max_entries = max_entries
+        self.mode = mode
+        self.lock = threading.Lock()
+        self.ready = False
+        self.touched = {}             # key -> last used, written with the next batch
+        self.unwritten = {}           # key -> response queued but not on disk yet
+        self.pending = queue.Queue()  # ("set", row) / ("touch", None) / ("clear", None)
+        self.writer = None
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    # === Storage ===
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def _init_disk(self):
+        if self.ready:
+            return self.path is not None
+        self.ready = True
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache "
+                    "(key TEXT PRIMARY KEY, model TEXT, request TEXT, response TEXT, created REAL, last_used REAL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)")
+        except Exception as e:
+            print(f"⚠️ LLM cache disabled: {e}")
+            self.path = None
+        return self.path is not None
+
+    def get(self, key):
+        """
+        Stored response text or None (blocking read; no write transaction).
+        """
+        with self.lock:
+            if key in self.unwritten:
+                self.hits += 1
+                return self.unwritten[key]
+            if not self._init_disk():
+                return None
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT response FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        except Exception as e:
+            print(f"⚠️ LLM cache read failed: {e}")
+            row = None
+        with self.lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.touched[key] = time.time()
+            flush_touches = len(self.touched) >= TOUCH_BATCH
+        if flush_touches:
+            self._enqueue("touch", None)
+        return row[0]
+
+    def set(self, key, model, request, response):
+        """
+        Queues the response for the writer thread (returns immediately).
+        """
+        now = time.time()
+        with self.lock:
+            self.unwritten[key] = response
+        self._enqueue("set", (key, model, json.dumps(request, default=str, ensure_ascii=False), response, now, now))
+
+    def _enqueue(self, op, item):
+        with self.lock:
+            if not self._init_disk():
+                return
+            if self.writer is None:
+                self.writer = threading.Thread(target=self._write_loop, name="llm-cache-writer", daemon=True)
+                self.writer.start()
+        self.pending.put((op, item))
+
+    def _write_loop(self):
+        while True:
+            batch = [self.pending.get()]
+            while True:
+                try:
+                    batch.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    self.pending.task_done()
+
+    def _write(self, batch):
+        with self.lock:
+            touched, self.touched = self.touched, {}
+        try:
+            with self._connect() as conn:
+                for op, item in batch:
+                    if op == "clear":
+                        conn.execute("DELETE FROM llm_cache")
+                    elif op == "set":
+                        conn.execute("INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?, ?)", item)
+                        with self.lock:
+                            self.writes += 1
+                conn.executemany("UPDATE llm_cache SET last_used = ? WHERE key = ?",
+                                 [(used, key) for key, used in touched.items()])
+                # Least recently used rows beyond max_entries are evicted
+                conn.execute(
+                    "DELETE FROM llm_cache WHERE key NOT IN "
+                    "(SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT ?)",
+                    (self.max_entries,)
+                )
+        except Exception as e:
+            print(f"⚠️ LLM cache write failed: {e}")
+        with self.lock:
+            for op, item in batch:
+                if op == "set" and self.unwritten.get(item[0]) == item[3]:
+                    del self.unwritten[item[0]]
+
+    def flush(self):
+        """
+        Blocks until queued writes (and last-used times) are on disk.
+        """
+        if self.writer is None:
+            return
+        with self.lock:
+            has_touches = bool(self.touched)
+        if has_touches:
+            self._enqueue("touch", None)
+        self.pending.join()
+
+    def clear(self):
+        with self.lock:
+            self.unwritten.clear()
+        self._enqueue("clear", None)
+        self.flush()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "pending_writes": self.pending.qsize(),
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    # === Completions ===
+    def _lookup(self, model, messages, params):
+        if self.mode == "off":
+            return None, None
+        key = completion_key(model, messages, **params)
+        cached = None if self.mode == "refresh" else self.get(key)
+        if cached is None and self.mode == "replay":
+            raise LLMCacheMiss(f"No cached LLM response for key {key[:12]} (replay mode)")
+        return key, cached
+
+    def _store(self, key, model, messages, params, content):
+        if key is not None and content:
+            self.set(key, model, {"messages": messages, "params": params}, content)
+
+    def complete(self, client, model, messages, **params):
+        """
+        client.chat.completions.create(...) read through the cache; returns the message text.
+        """
+        key, cached = self._lookup(model, messages, params)
+        if cached is not None:
+            return cached
+        response = client.chat.completions.create(model=model, messages=messages, **params)
+        content = response.choices[0].message.content or ""
+        self._store(key, model, messages, params, content)
+        return content
+
+    async def complete_async(self, client, model, messages, **params):
+        # The SQLite read runs in a worker thread; the write is queued
+        key, cached = await asyncio.to_thread(self._lookup, model, messages, params)
+        if cached is not None:
+            return cached
+        response = await client.chat.completions.create(model=model, messages=messages, **params)
+        content = response.choices[0].message.content or ""
+        self._store(key, model, messages, params, content)
+        return content
+
+
+# === Process-wide cache ===
+llm_cache = LLMResponseCache()
+atexit.register(llm_cache.flush)
+cached_completion = llm_cache.complete
+cached_completion_async = llm_cache.complete_async
@@ -0,0 +1,117 @@
+# utils/material_effects.py
+
+"""
+Sabine-style estimate of how swapping surface materials moves the acoustic features.
+
+The model never sees material names directly, only the room's absorption and the
+quantities derived from it. A swap changes the total absorption A by
+share * surface * (alpha_new - alpha_old) per element; RT60 scales with 1/A and the
+reverberant level drops by 10*log10(A_new / A_old).
+"""
+
+import math
+
+from utils.reference_data import material_directory
+
+ELEMENT_TYPES = ['wall', 'window', 'floor', 'door']
+
+# Rough share of the room's total surface per element type
+ELEMENT_AREA_SHARES = {'wall': 0.55, 'window': 0.10, 'floor': 0.30, 'door': 0.05}
+
+# Features that follow the absorption area (x ratio) and RT60 (/ ratio)
+ABSORPTION_FEATURES = ['absorption_coefficient_by_area_m', 'absorption_norm']
+RT60_FEATURES = ['rt60_s', 'rt60_norm']
+# Levels that drop with the reverberant field (dB)
+LEVEL_FEATURES = ['laeq_db', 'spl_db', 'spl_after_barrier_db', 'spl_after_facade_dampening_db']
+# Quantities proportional to spl_db
+SPL_RATIO_FEATURES = ['spl_norm', 'spl_per_surface']
+
+
+def material_coefficient(material_type, name):
+    """
+    Absorption coefficient for a material name (exact, then substring, case-insensitive).
+    Returns None for unknown materials.
+    """
+    if not name:
+        return None
+    name = str(name).lower()
+    for coef, material in material_directory[material_type]:
+        if material.lower() == name:
+            return coef
+    for coef, material in material_directory[material_type]:
+        if material.lower() in name:
+            return coef
+    return None
+
+
+def canonical_material(material_type, name):
+    if not name:
+        return None
+    name = str(name).lower()
+    for _, material in material_directory[material_type]:
+        if material.lower() == name:
+            return material
+    for _, material in material_directory[material_type]:
+        if material.lower() in name:
+            return material
+    return None
+
+
+def default_coefficient(material_type):
+    """
+    Baseline assumed for an element whose current material is not given.
+    """
+    coefs = [coef for coef, _ in material_directory[material_type]]
+    return sum(coefs) / len(coefs)
+
+
+def absorption_ratio(features, current, changes):
+    """
+    A_new / A_old for replacing current[element] with changes[element].
+    """
+    surface = features.get('total_surface_sqm') or 0.0
+    area = features.get('absorption_coefficient_by_area_m') or 0.0
+    if surface <= 0 or area <= 0:
+        return 1.0
+    delta = 0.0
+    for element, new_material in changes.items():
+        new_coef = material_coefficient(element, new_material)
+        if new_coef is None:
+            continue
+        old_coef = material_coefficient(element, current.get(element))
+        if old_coef is None:
+            old_coef = default_coefficient(element)
+        delta += ELEMENT_AREA_SHARES[element] * surface * (new_coef - old_coef)
+    # Never let a swap remove more than 90% of the room's absorption
+    return max(area + delta, 0.1 * area) / area
+
+
+def apply_material_changes(features, current, changes):
+    """
+    Returns a copy of features adjusted for the material changes
+    ({element_type: material_name}); current holds the materials in place now.
+    """
+    adjusted = dict(features)
+    ratio = absorption_ratio(features, current, changes)
+    if ratio == 1.0:
+        return adjusted
+    for col in ABSORPTION_FEATURES:
+        if isinstance(adjusted.get(col), (int, float)):
+            adjusted[col] = adjusted[col] * ratio
+    if isinstance(adjusted.get('absorption_norm'), (int, float)):
+        adjusted['absorption_norm'] = min(adjusted['absorption_norm'], 1.0)
+    for col in RT60_FEATURES:
+        if isinstance(adjusted.get(col), (int, float)):
+            adjusted[col] = adjusted[col] / ratio
+    level_drop = 10 * math.log10(ratio)
+    spl_before = adjusted.get('spl_db')
+    for col in LEVEL_FEATURES:
+        value = adjusted.get(col)
+        if isinstance(value, (int, float)) and value > 0:
+            adjusted[col] = max(value - level_drop, 0.0)
+    if isinstance(spl_before, (int, float)) and spl_before > 0:
+        spl_ratio = adjusted['spl_db'] / spl_before
+        for col in SPL_RATIO_FEATURES:
+            if isinstance(adjusted.get(col), (int, float)):
+                adjusted[col] = adjusted[col] * spl_ratio
+    return adjusted
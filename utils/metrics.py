@@ -0,0 +1,233 @@
+# utils/metrics.py
+
+"""
+Lightweight in-process metrics: per-stage latency histograms, counters and error counts.
+
+Stages are timed with `with span("sql_lookup"):` or the @timed("model_predict")
+decorator (sync and async functions). Stats from other components (prediction cache
+hit ratio, single-flight sharing, ...) are pulled in by registered collectors when the
+metrics are read. Exposed as Prometheus text on the API's /metrics and as a JSON dict
+via snapshot() for the CLI.
+"""
+
+import asyncio
+import bisect
+import functools
+import inspect
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = "ai25"
+# Seconds: sub-millisecond compiled scoring up to multi-second LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STAGE_SECONDS = "stage_duration_seconds"
+STAGE_ERRORS = "stage_errors_total"
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot = +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding the q-th observation (None when empty).
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + [float("inf")], self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.collectors = {}
+
+    # === Recording ===
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    @contextmanager
+    def span(self, stage):
+        """
+        Times a block as one observation of `stage`; exceptions are counted and re-raised.
+        A closed generator or a cancelled task (client went away) is not an error.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except (GeneratorExit, asyncio.CancelledError):
+            raise
+        except BaseException:
+            self.inc(STAGE_ERRORS, stage=stage)
+            raise
+        finally:
+            self.observe(STAGE_SECONDS, time.perf_counter() - start, stage=stage)
+
+    def timed(self, stage):
+        """
+        Decorator version of span() for sync and async functions.
+        """
+        def decorator(fn):
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(stage):
+                        return await fn(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(stage):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def register_collector(self, name, fn):
+        """
+        fn() -> dict of numbers, read on every snapshot / scrape (e.g. cache.stats).
+        """
+        with self.lock:
+            self.collectors[name] = fn
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    # === Export ===
+    def _collect(self):
+        collected = {}
+        for name, fn in list(self.collectors.items()):
+            try:
+                stats = fn()
+            except Exception as e:
+                print(f"⚠️ Metrics collector {name} failed: {e}")
+                continue
+            collected[name] = {k: v for k, v in stats.items() if isinstance(v, (int, float)) and not isinstance(v, bool)}
+        return collected
+
+    def snapshot(self):
+        """
+        JSON-able view: per-stage count / mean / approximate p50-p95-p99, counters, collectors.
+        """
+        with self.lock:
+            histograms = [(name, dict(labels), h.count, h.sum, h.quantile(0.5), h.quantile(0.95), h.quantile(0.99))
+                          for (name, labels), h in self.histograms.items()]
+            counters = [(name, dict(labels), value) for (name, labels), value in self.counters.items()]
+
+        stages = {}
+        other = {}
+        for name, labels, count, total, p50, p95, p99 in histograms:
+            entry = {
+                "count": count,
+                "total_s": round(total, 6),
+                "mean_ms": round(1000 * total / count, 3) if count else None,
+                "p50_ms": None if p50 is None else round(1000 * p50, 3),
+                "p95_ms": None if p95 is None else round(1000 * p95, 3),
+                "p99_ms": None if p99 is None else round(1000 * p99, 3),
+            }
+            if name == STAGE_SECONDS:
+                entry["errors"] = 0
+                stages[labels.get("stage")] = entry
+            else:
+                other.setdefault(name, []).append({"labels": labels, **entry})
+
+        counter_out = {}
+        for name, labels, value in counters:
+            if name == STAGE_ERRORS and labels.get("stage") in stages:
+                stages[labels["stage"]]["errors"] = value
+            counter_out.setdefault(name, []).append({"labels": labels, "value": value})
+
+        return {"stages": stages, "histograms": other, "counters": counter_out, "collectors": self._collect()}
+
+    def render_prometheus(self):
+        """
+        Prometheus text exposition format (version 0.0.4).
+        """
+        lines = []
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+
+        typed = set()
+        for (name, labels), h in histograms:
+            metric = f"{PREFIX}_{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            cumulative = 0
+            for bound, n in zip(h.buckets + ["+Inf"], h.counts):
+                cumulative += n
+                lines.append(f"{metric}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {h.sum}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {h.count}")
+
+        for (name, labels), value in counters:
+            metric = f"{PREFIX}_{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+        for collector, stats in self._collect().items():
+            for key, value in stats.items():
+                metric = f"{PREFIX}_{collector}_{key}"
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def dump_json(self, path=None):
+        """
+        Snapshot as JSON text; also written to path if given.
+        """
+        text = json.dumps(self.snapshot(), indent=2)
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+        return text
+
+
+# === Process-wide registry ===
+metrics = Metrics()
+span = metrics.span
+timed = metrics.timed
@@ -0,0 +1,218 @@
+# utils/prediction_cache.py
+
+"""
+Content-addressed cache for pipeline results.
+
+Keys are a SHA-256 over the canonical JSON of the (standardized) input plus the
+fingerprints of the files the result depends on (model pickle, dataset, ...), so a
+retrained model or regenerated dataset never serves stale results. Entries live in a
+bounded in-memory LRU with a TTL and can optionally be persisted to SQLite.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_fingerprints = {}
+_fingerprint_lock = threading.Lock()
+
+
+def canonical_hash(payload):
+    """
+    Stable SHA-256 of a JSON-able payload (dict key order does not matter).
+    """
+    blob = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def file_fingerprint(path):
+    """
+    SHA-256 of a file's content. Re-hashed only when its size or mtime changes.
+    Returns None for missing files.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    signature = (stat.st_size, stat.st_mtime_ns)
+    with _fingerprint_lock:
+        cached = _fingerprints.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    with _fingerprint_lock:
+        _fingerprints[path] = (signature, digest)
+    return digest
+
+
+class PredictionCache:
+    """
+    Bounded LRU + TTL cache with hit/miss counters and optional SQLite persistence.
+    Cleared automatically when any dependency file changes.
+    """
+
+    def __init__(self, dependencies=(), max_size=1024, ttl=3600, persist_path=None):
+        self.dependencies = list(dependencies)
+        self.max_size = max_size
+        self.ttl = ttl
+        self.persist_path = persist_path
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._dependency_state = None
+        if persist_path:
+            self._init_disk()
+
+    # === Disk persistence ===
+    def _connect(self):
+        return sqlite3.connect(self.persist_path, timeout=5)
+
+    def _init_disk(self):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.persist_path)), exist_ok=True)
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS prediction_cache "
+                    "(key TEXT PRIMARY KEY, dependencies TEXT, value TEXT, created REAL)"
+                )
+        except Exception as e:
+            print(f"⚠️ Prediction cache persistence disabled: {e}")
+            self.persist_path = None
+
+    def _disk_get(self, key):
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT value, created FROM prediction_cache WHERE key = ?", (key,)).fetchone()
+        except Exception as e:
+            print(f"⚠️ Prediction cache read failed: {e}")
+            return None
+        if row is None or (self.ttl and time.time() - row[1] > self.ttl):
+            return None
+        return json.loads(row[0]), row[1]
+
+    def _disk_set(self, key, value, created):
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO prediction_cache VALUES (?, ?, ?, ?)",
+                    (key, self._dependency_state, json.dumps(value, default=str, ensure_ascii=False), created)
+                )
+                # Keep the file bounded too: drop the oldest rows beyond max_size
+                conn.execute(
+                    "DELETE FROM prediction_cache WHERE key NOT IN "
+                    "(SELECT key FROM prediction_cache ORDER BY created DESC LIMIT ?)",
+                    (self.max_size,)
+                )
+        except Exception as e:
+            print(f"⚠️ Prediction cache write failed: {e}")
+
+    # === Invalidation ===
+    def _check_dependencies(self):
+        state = canonical_hash([file_fingerprint(path) for path in self.dependencies])
+        if state != self._dependency_state:
+            if self._dependency_state is not None:
+                print("🔄 Model or dataset changed - clearing prediction cache")
+                self.invalidations += 1
+            self.entries.clear()
+            if self.persist_path:
+                try:
+                    with self._connect() as conn:
+                        conn.execute("DELETE FROM prediction_cache WHERE dependencies != ?", (state,))
+                except Exception as e:
+                    print(f"⚠️ Prediction cache prune failed: {e}")
+            self._dependency_state = state
+        return state
+
+    # === Public API ===
+    def key(self, namespace, payload):
+        with self.lock:
+            state = self._check_dependencies()
+        return canonical_hash({"namespace": namespace, "payload": payload, "dependencies": state})
+
+    def get(self, key):
+        """
+        Returns a deep copy of the cached value, or None on a miss.
+        """
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.ttl and now - entry[1] > self.ttl:
+                del self.entries[key]
+                entry = None
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[0])
+        if self.persist_path:
+            stored = self._disk_get(key)
+            if stored is not None:
+                with self.lock:
+                    self._store(key, stored[0], stored[1])
+                    self.hits += 1
+                return copy.deepcopy(stored[0])
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def _store(self, key, value, created):
+        self.entries[key] = (value, created)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def set(self, key, value):
+        value = copy.deepcopy(value)
+        created = time.time()
+        with self.lock:
+            self._store(key, value, created)
+        if self.persist_path:
+            self._disk_set(key, value, created)
+
+    def get_or_compute(self, namespace, payload, compute):
+        """
+        Returns the cached result for (namespace, payload) or computes and stores it.
+        Exceptions from compute are not cached.
+        """
+        key = self.key(namespace, payload)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        value = compute()
+        self.set(key, value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+        if self.persist_path:
+            try:
+                with self._connect() as conn:
+                    conn.execute("DELETE FROM prediction_cache")
+            except Exception as e:
+                print(f"⚠️ Prediction cache clear failed: {e}")
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -7,8 +7,11 @@ import re
 # Add the project root to path for module imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from server.config import *
+from utils.metrics import timed
+from utils.llm_cache import cached_completion
 
 # Embedding wrapper
+@timed("embedding")
 def get_embedding(text, model=embedding_model):
     try:
         text = text.replace("\n", " ")
@@ -48,19 +51,22 @@ def get_vectors(query_vector, index_lib, n_results):
     return scored[:n_results]
 
 # RAG-style chat completion
-def rag_answer(question, prompt, model=completion_model):
+rag_llm = llm_backend("rag")
+
+@timed("llm_rag")
+def rag_answer(question, prompt, model=rag_llm.completion_model):
     try:
         print(f"[DEBUG] RAG: Sending prompt to LLM (length: {len(prompt)} chars)")
-        completion = client.chat.completions.create(
-            model=model,
-            messages=[
+        answer = cached_completion(
+            rag_llm.client,
+            model,
+            [
                 {"role": "system", "content": prompt},
                 {"role": "user", "content": question}
             ],
             temperature=0.1,
             max_tokens=4000,  # Increase token limit for complete responses
         )
-        answer = completion.choices[0].message.content
         print(f"[DEBUG] RAG: Received response (length: {len(answer)} chars)")
         print(f"[DEBUG] RAG: Response preview: {answer[:300]}...")
         return answer
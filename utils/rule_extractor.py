@@ -0,0 +1,233 @@
+# utils/rule_extractor.py
+
+"""
+Deterministic fast path for extract_variables.
+
+Most questions name their inputs from small closed vocabularies: the zones in
+DAY_RANGES/NIGHT_RANGES, 1Bed/2Bed/3Bed, the activity threshold keys and the names in
+material_directory. Those are compiled into regexes and token sets once. extract()
+resolves what it can and reports which fields were mentioned ("cue" words present)
+but not resolved. Only those go to the LLM; if nothing is left, the LLM call is skipped.
+"""
+
+import difflib
+import re
+import threading
+
+from utils.compliance_rules import ACTIVITY_THRESHOLDS
+from utils.reference_data import DAY_RANGES, NIGHT_RANGES, material_directory
+
+FIELDS = ["apartment_type", "zone", "floor_level", "activity", "time_period",
+          "wall_material", "window_material", "floor_material", "door_material", "element_materials"]
+
+# === Vocabularies ===
+def _compact(text):
+    return re.sub(r"[^a-z0-9]", "", text.lower())
+
+ZONES = sorted(set(DAY_RANGES) | set(NIGHT_RANGES))
+# "HD-Urban-V1", "hd urban v1" and "hdurbanv1" all compact to the same key; longest first
+ZONE_KEYS = sorted(((_compact(zone), zone) for zone in ZONES), key=lambda kv: -len(kv[0]))
+ZONE_CUE = re.compile(r"\b(zone|urban|roadside|road|industrial|greenedge|green|suburb\w*|city|street|highway)\b")
+
+NUMBER_WORDS = {"one": 1, "two": 2, "three": 3}
+APARTMENT = re.compile(r"\b([123]|one|two|three)\s*-?\s*(?:bed(?:room)?s?|br|bd|b)\b")
+APARTMENT_CUE = re.compile(r"\b(bed\w*|apartment|flat|studio)\b")
+
+ORDINALS = {
+    "ground": 0, "first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5,
+    "sixth": 6, "seventh": 7, "eighth": 8, "ninth": 9, "tenth": 10,
+}
+FLOOR_BEFORE = re.compile(r"\b(\d{1,3})(?:st|nd|rd|th)?\s*-?\s*(?:floor|storey|story|level)\b")
+FLOOR_AFTER = re.compile(r"\b(?:floor|storey|story|level)\s*(?:no\.?|number|#)?\s*(\d{1,3})\b")
+FLOOR_WORD = re.compile(r"\b(" + "|".join(ORDINALS) + r")\s+(?:floor|storey|story|level)\b")
+# "on the top floor", "floor level": a floor was mentioned even if we cannot read it
+FLOOR_CUE = re.compile(r"\b(?:on|at)\s+(?:the\s+)?\w+\s+(?:floor|storey|story)\b|\bfloor\s+(?:level|number)\b")
+
+ACTIVITY_SYNONYMS = {
+    "Sleeping": ["sleeping", "sleep"],
+    "Working": ["working", "work", "office", "home office"],
+    "Learning": ["learning", "study", "studying", "classroom", "school"],
+    "Living": ["living", "living room", "lounge"],
+    "Healing": ["healing", "hospital", "clinic", "recovery"],
+    "Co-working": ["co-working", "coworking", "co working", "shared office"],
+    "Exercise": ["exercise", "exercising", "gym", "workout", "fitness"],
+    "Dining": ["dining", "dinner", "eating"],
+}
+# Longest phrases first so "co-working" wins over "working" and "living room" over "living"
+ACTIVITY_PATTERNS = sorted(
+    ((re.compile(r"\b" + re.escape(phrase) + r"\b"), activity)
+     for activity, phrases in ACTIVITY_SYNONYMS.items() if activity in ACTIVITY_THRESHOLDS
+     for phrase in phrases),
+    key=lambda item: -len(item[0].pattern)
+)
+
+NIGHT = re.compile(r"\b(night|nighttime|night-time|overnight|evening)\b")
+DAY = re.compile(r"\b(day|daytime|day-time|daylight|morning|afternoon)\b")
+
+ELEMENT_STRING = re.compile(r"\b(?:Wall|Window|Floor|Door|Ceiling)\s*:\s*[^;:,?\n]+(?:;\s*(?:Wall|Window|Floor|Door|Ceiling)\s*:\s*[^;:,?\n]+)*", re.I)
+# Where a pasted element string runs on into the sentence ("...; Window: Laminated Glass for a 2Bed")
+ELEMENT_STRING_END = re.compile(r"\s+(?:for|in)\s+(?:a|an|the|my|our|this)\b.*$", re.I | re.S)
+
+# Words naming an element type (after TOKEN_SYNONYMS); partial material matches must sit next to one
+ELEMENT_CUES = {
+    "wall": {"wall", "walls"},
+    "window": {"window", "windows", "glass"},
+    "floor": {"floor", "floors", "flooring", "carpet", "parquet", "tile", "tiles"},
+    "door": {"door", "doors"},
+}
+CUE_DISTANCE = 3
+# Words that do not tell materials apart within an element type
+GENERIC_TOKENS = {"on", "with", "and", "the", "of", "door", "glass", "pane"}
+TOKEN_SYNONYMS = {"glazing": "glass", "glazed": "glass", "gypsum": "gypsum", "drywall": "gypsum",
+                  "plasterboard": "gypsum", "timber": "wood", "wooden": "wood", "concrete": "concrete",
+                  "fibreglass": "fiberglass", "brickwork": "brick", "bricks": "brick", "carpeted": "carpet"}
+
+
+def _tokens(text):
+    return [TOKEN_SYNONYMS.get(t, t) for t in re.findall(r"[a-z0-9]+", text.lower())]
+
+MATERIALS = {
+    element: [(name, _tokens(name)) for _, name in entries]
+    for element, entries in material_directory.items()
+}
+VOCABULARY = sorted({t for entries in MATERIALS.values() for _, tokens in entries for t in tokens if len(t) > 3})
+
+
+def _fix_typos(tokens):
+    # "gypsom board" -> "gypsum board"; only for unknown words long enough to be materials
+    fixed = []
+    for token in tokens:
+        if len(token) > 4 and token not in VOCABULARY and not token.isdigit():
+            close = difflib.get_close_matches(token, VOCABULARY, n=1, cutoff=0.85)
+            token = close[0] if close else token
+        fixed.append(token)
+    return fixed
+
+
+def _match_material(element, text_tokens):
+    """
+    Best material of one element type. An exact phrase wins (longest first); otherwise
+    the name with the largest share of its distinctive tokens present, counting only
+    tokens within CUE_DISTANCE words of the element's name ("concrete walls",
+    "single glazing").
+    """
+    joined = " " + " ".join(text_tokens) + " "
+    cue_positions = [i for i, t in enumerate(text_tokens) if t in ELEMENT_CUES[element]]
+    near_cue = {t for i, t in enumerate(text_tokens) if any(abs(i - j) <= CUE_DISTANCE for j in cue_positions)}
+    best, best_score = None, 0.0
+    for name, name_tokens in MATERIALS[element]:
+        if " " + " ".join(name_tokens) + " " in joined:
+            score = 2.0 + len(name_tokens)
+        else:
+            distinctive = [t for t in name_tokens if t not in GENERIC_TOKENS and t not in ELEMENT_CUES[element]]
+            if not distinctive:
+                continue
+            score = sum(t in near_cue for t in distinctive) / len(distinctive)
+        if score > best_score:
+            best, best_score = name, score
+    return best
+
+
+class Extraction:
+    def __init__(self, fields, unresolved):
+        self.fields = fields
+        self.unresolved = unresolved
+
+    @property
+    def needs_llm(self):
+        return bool(self.unresolved)
+
+    def merge(self, llm_fields):
+        """
+        Rule values win; the LLM only fills fields the rules could not resolve.
+        """
+        merged = dict(self.fields)
+        for key, value in (llm_fields or {}).items():
+            if key not in merged and value not in (None, ""):
+                merged[key] = value
+        return merged
+
+
+def extract(question):
+    """
+    Rule-based extraction. Returns an Extraction with the resolved fields and the
+    fields that were mentioned but could not be resolved.
+    """
+    text = (question or "").lower()
+    compact = _compact(text)
+    fields, unresolved = {}, []
+
+    # Zone
+    for key, zone in ZONE_KEYS:
+        if key in compact:
+            fields["zone"] = zone
+            break
+    else:
+        if ZONE_CUE.search(text):
+            unresolved.append("zone")
+
+    # Apartment type
+    match = APARTMENT.search(text)
+    if match:
+        count = match.group(1)
+        fields["apartment_type"] = f"{NUMBER_WORDS.get(count, count)}Bed"
+    elif APARTMENT_CUE.search(text):
+        unresolved.append("apartment_type")
+
+    # Floor level
+    match = FLOOR_BEFORE.search(text) or FLOOR_AFTER.search(text)
+    if match:
+        fields["floor_level"] = int(match.group(1))
+    else:
+        match = FLOOR_WORD.search(text)
+        if match:
+            fields["floor_level"] = ORDINALS[match.group(1)]
+        elif FLOOR_CUE.search(text):
+            unresolved.append("floor_level")
+
+    # Activity
+    for pattern, activity in ACTIVITY_PATTERNS:
+        if pattern.search(text):
+            fields["activity"] = activity
+            break
+
+    # Day / night
+    if NIGHT.search(text):
+        fields["time_period"] = "night"
+    elif DAY.search(text):
+        fields["time_period"] = "day"
+
+    # Materials: a pasted element string is kept whole, names are matched per element type
+    match = ELEMENT_STRING.search(question or "")
+    if match:
+        fields["element_materials"] = ELEMENT_STRING_END.sub("", match.group(0)).strip()
+    text_tokens = _fix_typos(_tokens(text))
+    for element in MATERIALS:
+        name = _match_material(element, text_tokens)
+        if name:
+            fields[f"{element}_material"] = name
+
+    return Extraction(fields, unresolved)
+
+
+# === Coverage stats ===
+_stats_lock = threading.Lock()
+_stats = {"questions": 0, "rules_only": 0, "llm_calls": 0, "fields_rules": 0, "fields_llm": 0}
+
+def record(extraction, llm_fields=None):
+    with _stats_lock:
+        _stats["questions"] += 1
+        _stats["fields_rules"] += len(extraction.fields)
+        if extraction.needs_llm:
+            _stats["llm_calls"] += 1
+            _stats["fields_llm"] += len([k for k in (llm_fields or {}) if k not in extraction.fields])
+        else:
+            _stats["rules_only"] += 1
+
+def stats():
+    with _stats_lock:
+        out = dict(_stats)
+    total_fields = out["fields_rules"] + out["fields_llm"]
+    out["coverage"] = round(out["rules_only"] / out["questions"], 4) if out["questions"] else 0.0
+    out["field_coverage"] = round(out["fields_rules"] / total_fields, 4) if total_fields else 0.0
+    return out
@@ -0,0 +1,290 @@
+# utils/semantic_cache.py
+
+"""
+Semantic cache for LLM extraction and summary calls.
+
+Entries live in an in-memory index (loaded once from SQLite, written back by a
+background thread) and are looked up in two steps: an exact hash of the normalized
+question (no embedding needed), then cosine similarity against the cached questions
+above a threshold. Every entry is also keyed on a structured payload (e.g. the pipeline
+result a summary was written for) and on the question's signature - its numbers and
+element / metric words - so "above 0.8?" never reuses the answer to "above 0.9?".
+Namespaces separate call types and models; entries expire after a TTL and both the
+index and the table are bounded.
+
+The default embedding is a hashed character n-gram vector: local, deterministic and
+sub-millisecond, which is what makes near-duplicate hits return in milliseconds.
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.prediction_cache import canonical_hash
+
+SEMANTIC_CACHE_PATH = "sql/semantic-cache.db"
+SIMILARITY_THRESHOLD = 0.88
+TTL_SECONDS = 7 * 24 * 3600
+MAX_ENTRIES = 20000
+EMBEDDING_DIM = 1024
+ENABLED = os.environ.get("AI25_SEMANTIC_CACHE", "1") != "0"
+
+# Words that change what is being asked even when the rest of the wording matches
+SIGNATURE_WORDS = {
+    "wall", "window", "floor", "door", "ceiling", "roof", "glazing",
+    "laeq", "rt60", "spl", "db", "decibel", "reverberation", "absorption", "noise", "comfort", "score",
+    "compliance", "compliant", "day", "night", "not", "above", "below", "over", "under",
+    "more", "less", "increase", "reduce", "improve", "cost", "cheapest", "best", "worst",
+}
+
+
+# === Question normalization / local embedding ===
+def normalize_question(text):
+    return " ".join(re.findall(r"[a-z0-9]+", (text or "").lower()))
+
+def question_signature(text):
+    """
+    Numbers and element / metric words of a question, e.g. ["0.8", "above", "comfort", "score"].
+    """
+    lowered = (text or "").lower()
+    numbers = re.findall(r"\d+(?:\.\d+)?", lowered)
+    words = {w[:-1] if w.endswith("s") and w[:-1] in SIGNATURE_WORDS else w for w in re.findall(r"[a-z0-9]+", lowered)}
+    return sorted(set(numbers)) + sorted(words & SIGNATURE_WORDS)
+
+def hashed_embedding(text, dim=EMBEDDING_DIM):
+    """
+    Unit vector of hashed word unigrams and character trigrams (stable across processes).
+    """
+    words = normalize_question(text).split()
+    vector = np.zeros(dim, dtype=np.float32)
+    features = list(words)
+    for word in words:
+        padded = f" {word} "
+        features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    for feature in features:
+        h = zlib.crc32(feature.encode("utf-8"))
+        vector[h % dim] += 1.0 if (h >> 16) & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticCache:
+    def __init__(self, path=SEMANTIC_CACHE_PATH, threshold=SIMILARITY_THRESHOLD, ttl=TTL_SECONDS,
+                 max_entries=MAX_ENTRIES, embed=hashed_embedding):
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.embed = embed
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # (namespace, key_hash, question_hash) -> (vector, value, created), oldest first
+        self.groups = {}              # (namespace, key_hash) -> {question_hash}
+        self.loaded = False
+        self.pending = queue.Queue()  # disk writes, applied by the writer thread
+        self.writer = None
+        self.hits_exact = 0
+        self.hits_semantic = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # === Storage ===
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def load(self):
+        """
+        Reads the table into memory once (blocking; the API does it during warmup).
+        """
+        with self.lock:
+            if self.loaded:
+                return
+            self.loaded = True
+            rows = self._read_disk()
+            for namespace, key_hash, question_hash, vector, value, created in rows:
+                self._index((namespace, key_hash, question_hash), np.frombuffer(vector, dtype=np.float32), json.loads(value), created)
+        if rows:
+            print(f"[DEBUG] Semantic cache loaded {len(rows)} entries")
+
+    def _read_disk(self):
+        if not self.path:
+            return []
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS semantic_cache ("
+                    "namespace TEXT, key_hash TEXT, question_hash TEXT, question TEXT, "
+                    "vector BLOB, value TEXT, created REAL, "
+                    "PRIMARY KEY (namespace, key_hash, question_hash))"
+                )
+                cutoff = time.time() - self.ttl if self.ttl else 0
+                return conn.execute(
+                    "SELECT namespace, key_hash, question_hash, vector, value, created "
+                    "FROM semantic_cache WHERE created >= ? ORDER BY created LIMIT ?", (cutoff, self.max_entries)
+                ).fetchall()
+        except Exception as e:
+            print(f"⚠️ Semantic cache persistence disabled: {e}")
+            self.path = None
+            return []
+
+    def _index(self, key, vector, value, created):
+        # Re-setting a question replaces its entry; the oldest entries go beyond max_entries
+        self.entries.pop(key, None)
+        self.entries[key] = (vector, value, created)
+        self.groups.setdefault(key[:2], set()).add(key[2])
+        while len(self.entries) > self.max_entries:
+            self._drop(next(iter(self.entries)))
+            self.evictions += 1
+
+    def _drop(self, key):
+        self.entries.pop(key, None)
+        group = self.groups.get(key[:2])
+        if group is not None:
+            group.discard(key[2])
+            if not group:
+                del self.groups[key[:2]]
+
+    def _expired(self, created, now):
+        return bool(self.ttl) and now - created > self.ttl
+
+    def _write_loop(self):
+        while True:
+            batch = [self.pending.get()]
+            while True:
+                try:
+                    batch.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    self.pending.task_done()
+
+    def _write(self, batch):
+        if not self.path:
+            return
+        try:
+            with self._connect() as conn:
+                for item in batch:
+                    if item is None:
+                        conn.execute("DELETE FROM semantic_cache")
+                        continue
+                    conn.execute("INSERT OR REPLACE INTO semantic_cache VALUES (?, ?, ?, ?, ?, ?, ?)", item)
+                now = time.time()
+                if self.ttl:
+                    conn.execute("DELETE FROM semantic_cache WHERE created < ?", (now - self.ttl,))
+                conn.execute(
+                    "DELETE FROM semantic_cache WHERE rowid NOT IN "
+                    "(SELECT rowid FROM semantic_cache ORDER BY created DESC LIMIT ?)", (self.max_entries,)
+                )
+        except Exception as e:
+            print(f"⚠️ Semantic cache write failed: {e}")
+
+    def _enqueue(self, item):
+        if not self.path:
+            return
+        with self.lock:
+            if self.writer is None:
+                self.writer = threading.Thread(target=self._write_loop, name="semantic-cache-writer", daemon=True)
+                self.writer.start()
+        self.pending.put(item)
+
+    def flush(self):
+        """
+        Blocks until queued disk writes are done (CLI exit, tests).
+        """
+        if self.writer is not None:
+            self.pending.join()
+
+    # === Public API ===
+    def _keys(self, question, key_payload):
+        key_hash = canonical_hash({"payload": key_payload, "signature": question_signature(question)})
+        question_hash = hashlib.sha256(normalize_question(question).encode("utf-8")).hexdigest()
+        return key_hash, question_hash
+
+    def get(self, namespace, question, key_payload=None):
+        """
+        Cached value for a question (exact or similar wording) with the same key payload
+        and signature, or None. In-memory only once loaded.
+        """
+        if not ENABLED:
+            return None
+        self.load()
+        key_hash, question_hash = self._keys(question, key_payload)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get((namespace, key_hash, question_hash))
+            if entry is not None and not self._expired(entry[2], now):
+                self.hits_exact += 1
+                return entry[1]
+            candidates = []
+            for other in list(self.groups.get((namespace, key_hash), ())):
+                key = (namespace, key_hash, other)
+                if self._expired(self.entries[key][2], now):
+                    self._drop(key)
+                else:
+                    candidates.append(self.entries[key])
+        if candidates:
+            query = self.embed(question)
+            similarities = np.stack([c[0] for c in candidates]) @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                with self.lock:
+                    self.hits_semantic += 1
+                return candidates[best][1]
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def set(self, namespace, question, value, key_payload=None):
+        if not ENABLED:
+            return
+        self.load()
+        key_hash, question_hash = self._keys(question, key_payload)
+        vector = self.embed(question)
+        created = time.time()
+        with self.lock:
+            self._index((namespace, key_hash, question_hash), vector, value, created)
+        self._enqueue((namespace, key_hash, question_hash, question, vector.astype(np.float32).tobytes(),
+                       json.dumps(value, default=str, ensure_ascii=False), created))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.groups.clear()
+        self._enqueue(None)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits_exact + self.hits_semantic + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits_exact": self.hits_exact,
+                "hits_semantic": self.hits_semantic,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round((self.hits_exact + self.hits_semantic) / lookups, 4) if lookups else 0.0,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_semantic_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SemanticCache()
+            atexit.register(_cache.flush)  # CLI runs exit right after their last set()
+    return _cache
@@ -0,0 +1,112 @@
+# utils/single_flight.py
+
+"""
+Request coalescing ("single-flight").
+
+While a computation for a key is running, identical calls do not start their own;
+they wait for the one in flight and share its result (or its exception). Nothing is
+kept once the call finishes - that is the prediction cache's job. SingleFlight is for
+threads (UI, pipeline), AsyncSingleFlight for coroutines on one event loop (API server).
+"""
+
+import asyncio
+import copy
+import threading
+
+from utils.prediction_cache import canonical_hash
+
+
+def flight_key(namespace, payload):
+    return canonical_hash({"namespace": namespace, "payload": payload})
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.waiters = 0
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        """
+        Runs fn() unless the same key is already in flight, in which case this waits
+        for that call. Waiters get a deep copy, so callers can mutate their result.
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            if call is None:
+                call = _Call()
+                self.calls[key] = call
+                self.executed += 1
+                leader = True
+            else:
+                call.waiters += 1
+                self.shared += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            result = fn()
+        except BaseException as e:
+            with self.lock:
+                del self.calls[key]
+            call.error = e
+            call.done.set()
+            raise
+        # Unregister and count waiters together: nobody can join after this, so the
+        # copy decision below covers every waiter
+        with self.lock:
+            del self.calls[key]
+            shared = call.waiters > 0
+        try:
+            # Only pay for the copy when someone is actually waiting
+            call.result = copy.deepcopy(result) if shared else result
+        except BaseException as e:
+            call.error = e
+        finally:
+            call.done.set()
+        return result
+
+    def stats(self):
+        with self.lock:
+            return {"in_flight": len(self.calls), "executed": self.executed, "shared": self.shared}
+
+
+class AsyncSingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self.calls = {}
+        self.executed = 0
+        self.shared = 0
+
+    async def do(self, key, factory):
+        """
+        Awaits factory() unless the same key is already in flight. The computation runs
+        as its own task, so a cancelled caller does not cancel it for the others.
+        """
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self.calls[key] = task
+            self.executed += 1
+            task.add_done_callback(lambda _: self.calls.pop(key, None))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {"in_flight": len(self.calls), "executed": self.executed, "shared": self.shared}
@@ -0,0 +1,172 @@
+# utils/sqlite_pool.py
+
+"""
+Pooled read access to the project's SQLite databases.
+
+Each thread keeps one long-lived read-only connection per database (mode=ro,
+memory-mapped I/O, larger page cache, in-memory temp tables for bulk key joins), so request handlers skip the connect cost.
+SQL text is built once per query shape and reused, so sqlite3's per-connection
+statement cache serves the compiled statement. Table schemas are introspected once
+and cached. Rows come back as plain tuples or dicts, with no DataFrame involved.
+
+When the database file is replaced (e.g. by sql/create_sql_db.py), connections and
+caches are dropped and reopened on next use.
+"""
+
+import os
+import sqlite3
+import threading
+
+MMAP_SIZE = 256 * 1024 * 1024
+CACHE_SIZE_KB = 16 * 1024
+CACHED_STATEMENTS = 256
+
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def enable_wal(db_path):
+    """
+    Switches a database to WAL so readers never block on the writer (and vice versa).
+    Must be done from a writable connection; the setting is persistent.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+    finally:
+        conn.close()
+
+
+class SQLitePool:
+    def __init__(self, db_path, mmap_size=MMAP_SIZE):
+        self.db_path = os.path.abspath(db_path)
+        self.mmap_size = mmap_size
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.signature = _file_signature(self.db_path)
+        self._schema = {}
+        self._sql = {}
+
+    # === Connections ===
+    def _check_file(self):
+        signature = _file_signature(self.db_path)
+        if signature != self.signature:
+            with self.lock:
+                if signature != self.signature:
+                    print(f"🔄 Database file changed, reconnecting: {self.db_path}")
+                    self.signature = signature
+                    self.generation += 1
+                    self._schema.clear()
+                    self._sql.clear()
+
+    def _open(self):
+        conn = sqlite3.connect(
+            f"file:{self.db_path}?mode=ro", uri=True,
+            check_same_thread=False, cached_statements=CACHED_STATEMENTS
+        )
+        # mode=ro protects the database file; query_only is left off so TEMP tables work
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    def connection(self):
+        """
+        This thread's read-only connection (opened on first use).
+        """
+        self._check_file()
+        conn = getattr(self.local, "conn", None)
+        if conn is None or self.local.generation != self.generation:
+            if conn is not None:
+                conn.close()
+            conn = self._open()
+            self.local.conn = conn
+            self.local.generation = self.generation
+        return conn
+
+    def close(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+    # === Cached SQL text and schema ===
+    def statement(self, key, build):
+        """
+        Returns the SQL text for a query shape, building it only once.
+        Identical text lets sqlite3 reuse its compiled statement.
+        """
+        sql = self._sql.get(key)
+        if sql is None:
+            sql = build()
+            self._sql[key] = sql
+        return sql
+
+    def columns(self, table):
+        """
+        Column names of a table, introspected once per database file.
+        """
+        self._check_file()
+        cols = self._schema.get(table)
+        if cols is None:
+            cols = [row[1] for row in self.connection().execute(f'PRAGMA table_info("{table}")')]
+            self._schema[table] = cols
+        return cols
+
+    def has_column(self, table, column):
+        return column in self.columns(table)
+
+    def has_table(self, table):
+        return bool(self.columns(table))
+
+    def load_temp_table(self, name, columns, rows):
+        """
+        (Re)fills a per-connection TEMP table with rows, e.g. lookup keys to join against.
+        """
+        conn = self.connection()
+        with conn:
+            conn.execute(f'CREATE TEMP TABLE IF NOT EXISTS "{name}" ({", ".join(columns)})')
+            conn.execute(f'DELETE FROM temp."{name}"')
+            conn.executemany(f'INSERT INTO temp."{name}" VALUES ({", ".join(["?"] * len(columns))})', rows)
+        return conn
+
+    # === Queries ===
+    def fetch_all(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchall()
+
+    def fetch_one(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchone()
+
+    def fetch_dicts(self, sql, params=()):
+        cursor = self.connection().execute(sql, params)
+        names = [d[0] for d in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def fetch_dict(self, sql, params=()):
+        cursor = self.connection().execute(sql, params)
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip([d[0] for d in cursor.description], row))
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_path):
+    """
+    Shared pool per database file.
+    """
+    key = os.path.abspath(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = SQLitePool(key)
+            _pools[key] = pool
+    return pool